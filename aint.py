@@ -1,5 +1,6 @@
 import sys, re
 import xml.etree.ElementTree as ET
+from output import Output
 
 
 class Stats:
@@ -103,6 +104,18 @@ class Nil:
         self._nil = "nil"
 
 
+class CharBuffer(list):
+    """ Class represents string variable modified by SETCHAR, characters are kept
+        in list, so SETCHAR does not copy whole string. GETCHAR, STRI2INT and STRLEN
+        read it directly, other instructions join it back into string """
+
+    def __str__(self):
+        return "".join(self)
+
+    def __repr__(self):
+        return repr("".join(self))
+
+
 class Stack:
     """ Class represents ADT stack and operations with it """
 
@@ -174,6 +187,10 @@ class Interpret:
         """ I/O """
         self.__source = 0
         self.__input = "STDIN"
+        self.__output = Output()
+
+        """ Output of WRITE with constant, encoded when it is written for the first time """
+        self.__constants = {}
 
         """ Current number of performed instruction
             Like EIP register in CPU """
@@ -190,6 +207,8 @@ class Interpret:
 
     def print_error(self, message, number):
         """ Method prints out given error message and exits with given number. """
+        if self is not None:
+            self.__output.flush()
         print(message, file=sys.stderr, end="")
         sys.exit(number)
 
@@ -240,10 +259,8 @@ class Interpret:
         self.__callStack = Stack()
 
         try:
+            """ Source is only opened, check_xml() parses it as stream. """
             self.__source = open(self.__source, "r")
-            backup = self.__source
-            self.__source = self.__source.read()
-            backup.close()
 
             if self.__input != "STDIN":
                 self.__input = open(self.__input, "r")
@@ -251,35 +268,59 @@ class Interpret:
             self.print_error("Error, couldnt open source/input file!\n", 11)
 
     def check_xml(self):
-        """ Method parses source XML file, checks if its well-formed and checks the required head. """
+        """ Method parses source XML file, checks if its well-formed and checks the required head.
+            Source is parsed as stream, only instruction elements are kept, everything else is dropped
+            as soon as it is closed, so the whole file is never held in memory. """
+        instructions = []
+        orders = set()
+        root = None
+        error = None
+        depth = 0
+
         try:
-            self.__source = ET.ElementTree(ET.fromstring(self.__source))
+            for event, element in ET.iterparse(self.__source, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    """ Get head """
+                    if root is None:
+                        root = element
+                        if root.tag != "program" or root.get("language") != "IPPcode19":
+                            error = "Error, wrong XML root element!\n"
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+                if element.tag == "instruction" and error is None:
+                    """ Order has to be number and unique. """
+                    try:
+                        order = int(element.get("order"))
+                    except:
+                        error = "Error, invalid order attributes!\n"
+                    else:
+                        if order in orders:
+                            error = "Error, opcodes does have not continous numbers!\n"
+                        orders.add(order)
+                        instructions.append((order, element))
+                root.clear()
         except:
             self.print_error("Error, xml is not well-formed!\n", 11)
+        finally:
+            self.__source.close()
 
-        """ Get head """
-        self.__source = self.__source.getroot()
-        prog = self.__source.tag
-        head = self.__source.get("language")
-
-        if prog != "program" or head != "IPPcode19":
-            self.print_error("Error, wrong XML root element!\n", 32)
+        if error is not None:
+            self.print_error(error, 32)
 
-        self.__source = self.__source.findall("instruction")
         """ Sorting the instructions by order. """
-        try:
-            self.__source[:] = sorted(self.__source, key=lambda child: int(child.get("order")))
-        except:
-            self.print_error("Error, invalid order attributes!\n", 32)
+        instructions.sort(key=lambda child: child[0])
+        self.__source = [child for order, child in instructions]
 
         check_len = len(self.__source)
         self.__instrCount = check_len
 
         """ Check if the instructions has continuos numbers. """
         for i in range(0, check_len):
-            order = self.__source[i]
-
-            if int(order.get("order")) != (i + 1):
+            if instructions[i][0] != (i + 1):
                 self.print_error("Error, opcodes does have not continous numbers!\n", 32)
 
     """ Lexer """
@@ -522,11 +563,13 @@ class Interpret:
 
         return value
 
-    def check_if_exists(self, frame, var, op, checkIfNone):
+    def check_if_exists(self, frame, var, op, checkIfNone, keepBuffer=False):
         """ Method checks up, if the the given "var" variable, exists in the
         given "frame" refference. "op" signifies current performed instruction
         for easy error reporting. "checkIfNone" flag signifies the method, to check
-        if the given variable is unitialized (no interpreter data type). """
+        if the given variable is unitialized (no interpreter data type).
+        Checked variable is going to be read, so CharBuffer is joined back into
+        string, unless "keepBuffer" flag is set. """
         if frame == None:
             self.print_error("Error, " + op + " destination variable frame is not initiliazed!\n", 55)
         elif not var in frame:
@@ -534,6 +577,8 @@ class Interpret:
         elif checkIfNone:
             if frame[var] is None:
                 self.print_error("Error, " + op + " variable is not initalized!\n", 56)
+            elif type(frame[var]) is CharBuffer and not keepBuffer:
+                frame[var] = "".join(frame[var])
 
     def check_if_label_exists(self, label, op):
         """ Method checks if the given "label" name is existing in label dictionary """
@@ -841,12 +886,12 @@ class Interpret:
 
         type_1, src1, whatIsIt = self.parse_symb(self.__instruction.arg2)
         if whatIsIt == "var":
-            self.check_if_exists(type_1, src1, "STRI2INT", True)
+            self.check_if_exists(type_1, src1, "STRI2INT", True, True)
             src1 = type_1[src1]
         else:
             src1 = self.get_value(type_1, src1)
 
-        if type(src1) is not str:
+        if type(src1) is not str and type(src1) is not CharBuffer:
             self.print_error("Error, STRI2INT <symb1> is not string!\n", 53)
 
         type_2, index, whatIsIt = self.parse_symb(self.__instruction.arg3)
@@ -877,7 +922,13 @@ class Interpret:
         dataType = self.parse_type(self.__instruction.arg2)
 
         if self.__input == "STDIN":
-            value = input()
+            """ input() flushes stdout and stderr and checks terminal on every call,
+                reading line from stdin directly is several times faster """
+            value = sys.stdin.readline()
+            if value == "":
+                raise EOFError("EOF when reading a line")
+            if value.endswith("\n"):
+                value = value[:-1]
         else:
             value = self.__input.readline()
             if value.endswith("\n"):
@@ -914,12 +965,17 @@ class Interpret:
             self.print_error("Error, wrong arguments on WRITE instruction!\n", 32)
 
         type_1, src, whatIsIt = self.parse_symb(self.__instruction.arg1)
-        if whatIsIt == "var":
+        if whatIsIt == "const":
+            key = (type_1, src)
+            if key in self.__constants:
+                self.__output.writeBytes(self.__constants[key])
+                return
+            src = self.get_value(type_1, src)
+        else:
             self.check_if_exists(type_1, src, "WRITE", True)
             src = type_1[src]
-        else:
-            src = self.get_value(type_1, src)
-        if type_1 == "string" or type(src) is str:
+        """ Only backslash starts escape sequence, so regex is not needed without it """
+        if (type_1 == "string" or type(src) is str) and "\\" in src:
             src = self.format_string(src)
         if type(src) is bool:
             if src == True:
@@ -929,7 +985,11 @@ class Interpret:
         if type(src) is Nil:
             src = ""
 
-        print(str(src), end="")
+        if whatIsIt == "const":
+            self.__constants[key] = self.__output.encode(str(src))
+            self.__output.writeBytes(self.__constants[key])
+        else:
+            self.__output.write(str(src))
 
     def concat(self):
         """ Method emulates the "CONCAT" instruction from IPPcode19 """
@@ -972,12 +1032,12 @@ class Interpret:
 
         type_1, src1, whatIsIt = self.parse_symb(self.__instruction.arg2)
         if whatIsIt == "var":
-            self.check_if_exists(type_1, src1, "STRLEN", True)
+            self.check_if_exists(type_1, src1, "STRLEN", True, True)
             src1 = type_1[src1]
         else:
             src1 = self.get_value(type_1, src1)
 
-        if type(src1) is not str:
+        if type(src1) is not str and type(src1) is not CharBuffer:
             self.print_error("Error, STRLEN must be string!\n", 53)
 
         frame[dst] = len(src1)
@@ -994,12 +1054,12 @@ class Interpret:
 
         type_1, src1, whatIsIt = self.parse_symb(self.__instruction.arg2)
         if whatIsIt == "var":
-            self.check_if_exists(type_1, src1, "GETCHAR", True)
+            self.check_if_exists(type_1, src1, "GETCHAR", True, True)
             src1 = type_1[src1]
         else:
             src1 = self.get_value(type_1, src1)
 
-        if type(src1) is not str:
+        if type(src1) is not str and type(src1) is not CharBuffer:
             self.print_error("Error, GETCHAR <symb1> is not string!\n", 53)
 
         type_2, index, whatIsIt = self.parse_symb(self.__instruction.arg3)
@@ -1025,9 +1085,9 @@ class Interpret:
             self.print_error("Error, wrong arguments on SETCHAR instruction!\n", 32)
 
         frame, dst = self.parse_var(self.__instruction.arg1)
-        self.check_if_exists(frame, dst, "SETCHAR", True)
+        self.check_if_exists(frame, dst, "SETCHAR", True, True)
 
-        if type(frame[dst]) is not str:
+        if type(frame[dst]) is not str and type(frame[dst]) is not CharBuffer:
             self.print_error("Error, SETCHAR <var> is not string!\n", 53)
 
         type_1, index, whatIsIt = self.parse_symb(self.__instruction.arg2)
@@ -1053,10 +1113,10 @@ class Interpret:
         if index >= len(frame[dst]) or index < 0 or src == "":
             self.print_error("Error, SETCHAR index is out of range!\n", 58)
 
-        string = list(frame[dst])
-        string[index] = src[0]
-        string = "".join(string)
-        frame[dst] = string
+        """ Reading of <symb2> may have joined buffer back, when it is the same variable """
+        if type(frame[dst]) is not CharBuffer:
+            frame[dst] = CharBuffer(frame[dst])
+        frame[dst][index] = src[0]
 
     def type_(self):
         """ Method emulates the "TYPE" instruction from IPPcode19 """
@@ -1079,7 +1139,7 @@ class Interpret:
             frame[dst] = "int"
         elif type(src) is bool:
             frame[dst] = "bool"
-        elif type(src) is str:
+        elif type(src) is str or type(src) is CharBuffer:
             frame[dst] = "string"
         elif type(src) is Nil:
             frame[dst] = "nil"
@@ -1156,6 +1216,7 @@ class Interpret:
         elif not source >= 0 or not source <= 49:
             self.print_error("Error, EXIT wrong exit number!\n", 57)
 
+        self.__output.flush()
         self.__stats.print_results()
         sys.exit(source)
 
@@ -1170,6 +1231,7 @@ class Interpret:
 
         self.check_if_exists(frame, src, "DPRINT", False)
 
+        self.__output.flush()
         print(str(frame[src]), file=sys.stderr)
 
     def break_(self):
@@ -1178,6 +1240,7 @@ class Interpret:
         if argc != 0:
             self.print_error("Error, wrong arguments on BREAK instruction!\n", 32)
 
+        self.__output.flush()
         print("DEBUG INFO:", file=sys.stderr)
         print("order = " + str(self.__order), file=sys.stderr)
         print("GF = " + str(self.__gf), file=sys.stderr)
@@ -1474,6 +1537,8 @@ class Interpret:
 
             self.get_instruction()
 
+        self.__output.flush()
+
     def print_stats(self):
         """ Method calls the stats method to print out the results of interpretation """
         self.__stats.print_results()
@@ -0,0 +1,67 @@
+import os
+import site
+from concurrent import futures
+
+from interpret import Result, run
+
+# directory of interpreter modules, workers import them from there
+HERE = os.path.dirname(os.path.abspath(__file__))
+POOLS = ['processes', 'interpreters', 'threads']
+
+
+def runJob(source, input, engine, scan, cachedir):
+    """
+    Runs one program in worker
+    Only bytes, strings and tuples are passed between workers, so job works the same way in thread,
+    process and subinterpreter
+    :param source: XML source as bytes
+    :param input: Input for READ as string
+    :param engine: Execution engine
+    :param scan: Parse source by fast scanner when it can
+    :param cachedir: Directory of .ippc compiled programs shared by workers, None to compile every time
+    :return: Tuple (code, executed, output)
+    """
+    return tuple(run(source, input, engine=engine, scan=scan, ippc=cachedir is not None, cachedir=cachedir))
+
+
+def makePool(kind, workers=None):
+    """
+    Creates executor for batch
+    Subinterpreters need Python 3.14+, older versions get process pool, which isolates programs the same way
+    Process pool is the default, subinterpreters are used only when asked for
+    :param kind: 'interpreters', 'processes' or 'threads'
+    :param workers: Number of workers, None for number of CPUs
+    :return: Executor
+    """
+    if kind == 'interpreters':
+        executor = getattr(futures, 'InterpreterPoolExecutor', None)
+        if executor is not None:
+            # new interpreter does not have directory of main script in sys.path, it has to be added
+            # before runJob is unpickled there, so initializer has to come from standard library
+            return executor(workers, initializer=site.addsitedir, initargs=(HERE,))
+        kind = 'processes'
+    if kind == 'processes':
+        return futures.ProcessPoolExecutor(workers)
+    return futures.ThreadPoolExecutor(workers)
+
+
+def runBatch(jobs, workers=None, pool='processes', engine='reference', scan=False, cachedir=None):
+    """
+    Runs independent programs in parallel, each in its own virtual machine
+    XML source is the serialized form of program passed to worker, it is compiled there
+    :param jobs: List of (source bytes, input string) pairs
+    :param workers: Number of workers, None for number of CPUs
+    :param pool: 'processes' (default), 'interpreters' or 'threads'
+    :param engine: Execution engine
+    :param scan: Parse sources by fast scanner when it can
+    :param cachedir: Directory of .ippc compiled programs, program run with many inputs is compiled only once
+    :return: List of Result in order of jobs
+    """
+    sources = [source for source, _ in jobs]
+    inputs = [data for _, data in jobs]
+    with makePool(pool, workers) as executor:
+        # bigger chunks save round trips to processes, other executors ignore it
+        chunk = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        n = len(jobs)
+        results = executor.map(runJob, sources, inputs, [engine] * n, [scan] * n, [cachedir] * n, chunksize=chunk)
+        return [Result(*x) for x in results]
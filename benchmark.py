@@ -0,0 +1,87 @@
+import argparse
+import glob
+import os.path
+import sys
+import time
+
+from batch import POOLS, runBatch
+
+# programs of tests directory which never end
+ENDLESS = ['source.xml']
+
+
+def loadJobs(paths):
+    """
+    Reads programs of workload, input of program is file with the same name and .in extension
+    :param paths: Paths to XML sources
+    :return: List of (name, source bytes, input string) tuples
+    """
+    jobs = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            source = f.read()
+        data = ''
+        inputPath = os.path.splitext(path)[0] + '.in'
+        if os.path.isfile(inputPath):
+            with open(inputPath) as f:
+                data = f.read()
+        jobs.append((os.path.basename(path), source, data))
+    return jobs
+
+
+def measure(jobs, workers, repeat, engine, pool, scan, cachedir):
+    """
+    Runs every program of workload repeat times on pool of workers
+    :param jobs: Workload from loadJobs()
+    :param workers: Number of workers
+    :param repeat: How many times is workload run
+    :param engine: Execution engine
+    :param pool: Kind of pool, see batch.makePool()
+    :param scan: Parse sources by fast scanner when it can
+    :param cachedir: Directory of .ippc compiled programs or None
+    :return: Seconds and list of results in workload order
+    """
+    work = [(source, data) for _, source, data in jobs] * repeat
+    start = time.perf_counter()
+    results = runBatch(work, workers, pool, engine, scan, cachedir)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parse = argparse.ArgumentParser(description='throughput of independent programs run on pool of workers')
+    parse.add_argument('programs', nargs='*', help='XML sources, programs of tests directory by default')
+    parse.add_argument('--workers', default='1,2,4,8', help='comma separated numbers of workers')
+    parse.add_argument('--pool', choices=POOLS, default='threads',
+                       help="'threads', 'interpreters' (Python 3.14+, processes on older versions) or 'processes'")
+    parse.add_argument('--repeat', type=int, default=20, help='how many times is workload run')
+    parse.add_argument('--engine', choices=['reference', 'threaded', 'transpiled', 'tracing'], default='reference')
+    parse.add_argument('--scan', action='store_true', help='parse plain generated XML by fast scanner')
+    parse.add_argument('--cache-dir', help='directory of .ippc compiled programs shared by workers')
+    args = parse.parse_args()
+
+    paths = args.programs
+    if not paths:
+        tests = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests')
+        paths = sorted(x for x in glob.glob(os.path.join(tests, '*.xml')) if os.path.basename(x) not in ENDLESS)
+    jobs = loadJobs(paths)
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f'{len(jobs)} programs x {args.repeat}, engine {args.engine}, pool {args.pool}, scanner {args.scan}, '
+          f'GIL {"enabled" if gil else "disabled"}, {os.cpu_count()} CPUs')
+
+    expected = None
+    base = None
+    for workers in [int(x) for x in args.workers.split(',')]:
+        seconds, results = measure(jobs, workers, args.repeat, args.engine, args.pool, args.scan, args.cache_dir)
+        # VMs share nothing, so results can not depend on number of workers
+        if expected is None:
+            expected = results
+        elif results != expected:
+            print(f'results with {workers} workers differ', file=sys.stderr)
+            sys.exit(1)
+        rate = len(results) / seconds
+        base = base or rate
+        print(f'{workers:3} workers {seconds:8.3f} s {rate:10.1f} programs/s  speedup {rate / base:5.2f}')
+
+
+if __name__ == '__main__':
+    main()
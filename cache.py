@@ -0,0 +1,124 @@
+import hashlib
+import marshal
+import os
+import tempfile
+
+# header of .ippc compiled program, version is raised whenever image of compiled program changes
+IPPC_MAGIC = b'IPPC'
+IPPC_VERSION = 1
+# umask of process, cached files get the mode any other new file would get, it is read once because reading sets it
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def sourceDigest(data=None, path=None):
+    """
+    Returns hash of XML source, used as key of cached artifacts
+    :param data: Source bytes
+    :param path: Path to source file, read in chunks if data is not given
+    :return: Hex digest
+    """
+    digest = hashlib.sha256()
+    if data is not None:
+        digest.update(data)
+    else:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cachePath(cachedir, digest, ext):
+    """
+    Returns path of cached artifact for given source hash
+    :param cachedir: Cache directory
+    :param digest: Source hash
+    :param ext: Extension of artifact
+    :return: Path to artifact
+    """
+    return os.path.join(cachedir, digest + ext)
+
+
+def writeAtomic(path, data):
+    """
+    Writes file so other processes never see it half written
+    Data goes into temporary file in the same directory, which then replaces target
+    Missing directory is created with .gitignore ignoring all of it
+    :param path: Target path
+    :param data: Bytes to write
+    :return: Nothing
+    """
+    directory = os.path.dirname(path) or '.'
+    if not os.path.isdir(directory):
+        # directory made for cache ignores itself, so cached artifacts are never committed with sources
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.gitignore'), 'w') as f:
+            f.write('*\n')
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # temporary file is readable by owner only, cache may be shared by workers of other users
+        os.chmod(tmp, 0o666 & ~UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def imagePath(source, cachedir, digest):
+    """
+    Returns path of .ippc compiled program, it is in cache directory when one is given, next to source file otherwise
+    :param source: Path to source file, None if source is not a file
+    :param cachedir: Cache directory or None
+    :param digest: Source hash
+    :return: Path or None if there is no place for it
+    """
+    if cachedir is not None:
+        return cachePath(cachedir, digest, '.ippc')
+    if source is None:
+        return None
+    return os.path.splitext(source)[0] + '.ippc'
+
+
+def writeImage(path, digest, image):
+    """
+    Stores image of compiled program as .ippc file
+    File is header followed by marshalled (version, source hash, image), hash is stored too, because file next to
+    source has the same name for every version of source
+    Failure to write is ignored, program just is not cached
+    :param path: Path of .ippc file
+    :param digest: Hash of XML source image was compiled from
+    :param image: Image from InstructionHandler.image()
+    :return: Nothing
+    """
+    try:
+        writeAtomic(path, IPPC_MAGIC + marshal.dumps((IPPC_VERSION, digest, image)))
+    except (OSError, ValueError):
+        pass
+
+
+def readImage(path, digest):
+    """
+    Loads image of compiled program from .ippc file
+    :param path: Path of .ippc file
+    :param digest: Hash of current XML source
+    :return: Image or None if file is missing, damaged, of other version or compiled from other source
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(IPPC_MAGIC):
+        return None
+    try:
+        version, stored, image = marshal.loads(data[len(IPPC_MAGIC):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    if version != IPPC_VERSION or stored != digest:
+        return None
+    return image
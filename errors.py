@@ -0,0 +1,72 @@
+class IPPError(Exception):
+    """
+    Base class of errors of interpreted program and its source
+    Code is return code of interpreter, interpret.py exits with it
+    """
+    code = 99
+
+    def __init__(self, message=''):
+        super().__init__(message or self.__class__.__name__)
+
+
+class ParameterError(IPPError):
+    code = 10
+
+
+class InputFileError(IPPError):
+    code = 11
+
+
+class HeaderError(IPPError):
+    code = 21
+
+
+class XMLFormatError(IPPError):
+    code = 31
+
+
+class XMLStructureError(IPPError):
+    code = 32
+
+
+class SemanticError(IPPError):
+    code = 52
+
+
+class OperandTypeError(IPPError):
+    code = 53
+
+
+class UndefinedVariableError(IPPError):
+    code = 54
+
+
+class MissingFrameError(IPPError):
+    code = 55
+
+
+class MissingValueError(IPPError):
+    code = 56
+
+
+class OperandValueError(IPPError):
+    code = 57
+
+
+class StringError(IPPError):
+    code = 58
+
+
+class ProgramExit(Exception):
+    """
+    Raised by EXIT instruction, it is not an error, it only unwinds interpreter loop
+    """
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class InputPending(Exception):
+    """
+    Raised by asynchronous input when READ has no line available yet, instruction is executed again later
+    """
@@ -1,6 +1,6 @@
-import sys
 import re
 from globals import *
+from errors import *
 
 
 #  object for representing instruction
@@ -12,16 +12,16 @@ class Instruction:
             if opcode in OPCODES:
                 self.name = opcode
             else:
-                sys.exit(32)
+                raise XMLStructureError()
             self.order = ins.attrib["order"]
         except KeyError:  # key doesn't exist
-            sys.exit(32)
+            raise XMLStructureError()
 
         #  check if element tag is 'instruction'
         if ins.tag == 'instruction':
             args = list(ins)  # get args into list
         else:
-            sys.exit(32)
+            raise XMLStructureError()
         # arguments can be unsorted, so sort them
         args.sort(key=lambda x: x.tag)
 
@@ -65,7 +65,7 @@ class Instruction:
                     continue
 
                 else:
-                    sys.exit(32)
+                    raise XMLStructureError()
 
             elif i == 1:
                 self.arg1 = Argument(None)
@@ -97,7 +97,7 @@ class Argument:
 
         if self.type is not None:
             if self.typeCheck() is None:
-                sys.exit(32)
+                raise XMLStructureError()
 
     def typeCheck(self):
         if self.type == 'label':
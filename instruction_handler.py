@@ -1,6 +1,9 @@
 import sys
 import re
+import operator
 from globals import *
+from errors import *
+from output import Output
 
 
 def checkArgCount(ins):
@@ -11,37 +14,240 @@ def checkArgCount(ins):
     """
     if ins.name in ARGC0:
         if ins.arg1.type or ins.arg2.type or ins.arg3.type is not None:
-            sys.exit(32)
+            raise XMLStructureError()
 
     if ins.name in ARGC1:
         if ins.arg1.type is None or ins.arg2.type is not None or ins.arg3.type is not None:
-            sys.exit(32)
+            raise XMLStructureError()
 
     if ins.name in ARGC2:
         if ins.arg1.type is None or ins.arg2.type is None or ins.arg3.type is not None:
-            sys.exit(32)
+            raise XMLStructureError()
 
     if ins.name in ARGC3:
         if ins.arg1.type is None or ins.arg2.type is None or ins.arg3.type is None:
-            sys.exit(32)
+            raise XMLStructureError()
+
+
+class Nil:
+    """
+    Class representing nil value, NIL is its only instance
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'nil'
+
+
+NIL = Nil()
+
+# IPPcode22 type names of native values stored in frames and on data stack
+TYPENAMES = {int: 'int', bool: 'bool', str: 'string', Nil: 'nil'}
+
+
+def typeOf(value):
+    """
+    Returns IPPcode22 type name of native value
+    :param value: Native value
+    :return: Type name or None for uninitialized variable
+    """
+    return TYPENAMES.get(type(value))
+
+
+def toString(value):
+    """
+    Converts native value into text used by WRITE and DPRINT
+    :param value: Native value
+    :return: String representation of value
+    """
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if value is NIL:
+        return ''
+    return str(value)
+
+
+def readValue(line, type):
+    """
+    Converts line read by READ into value of given type
+    :param line: Line as returned by readline(), '' only at end of input
+    :param type: 'int', 'string' or 'bool'
+    :return: Value, nil at end of input for every type and for invalid int
+    """
+    if line == '':
+        return NIL
+    line = line.strip()
+    if type == 'bool':
+        return line.lower() == 'true'
+    if type == 'int':
+        try:
+            return int(line)
+        except ValueError:
+            return NIL
+    return line
+
+
+class Undeclared:
+    """
+    Class representing slot of variable which was not declared by DEFVAR yet, UNDECLARED is its only instance
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<undeclared>'
+
+
+UNDECLARED = Undeclared()
+
+# shortest CONCAT result kept as lazy string, shorter ones are cheaper to copy
+LAZYMIN = 256
+
+
+class StringBuilder:
+    """
+    Append-only buffer of string chunks, shared by lazy strings built one on top of another
+    """
+    __slots__ = ('chunks', 'length')
+
+    def __init__(self, text):
+        self.chunks = [text]
+        self.length = len(text)
+
+    def append(self, text):
+        self.chunks.append(text)
+        self.length += len(text)
+
+    def text(self, length):
+        """
+        Joins chunks into flat string, result replaces chunks, so they are never joined twice
+        :param length: Length of prefix to return
+        :return: First length characters of buffer
+        """
+        if len(self.chunks) > 1:
+            self.chunks = [''.join(self.chunks)]
+        text = self.chunks[0]
+        return text if length == len(text) else text[:length]
+
+
+class LazyString:
+    """
+    String value created by CONCAT, it is view of first length characters of StringBuilder
+    Flat string is built only when it is needed (STRLEN, GETCHAR, comparisons, WRITE, data stack...),
+    so CONCAT in a loop appends chunk instead of copying whole string every time
+    """
+    __slots__ = ('builder', 'length', 'flat')
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.length = builder.length
+        self.flat = None
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        if self.flat is None:
+            self.flat = self.builder.text(self.length)
+        return self.flat
+
+    def __repr__(self):
+        return repr(str(self))
+
+
+def concat(val1, val2):
+    """
+    Concatenates strings, long result is LazyString sharing builder of val1 when val1 is its newest view
+    :param val1: String or LazyString
+    :param val2: String or LazyString
+    :return: String or LazyString
+    """
+    if type(val2) is LazyString:
+        val2 = str(val2)
+    if type(val1) is LazyString:
+        builder = val1.builder
+        if val1.length != builder.length:
+            # builder was already extended by other CONCAT, appending would change that string
+            builder = StringBuilder(str(val1))
+    elif len(val1) + len(val2) < LAZYMIN:
+        return val1 + val2
+    else:
+        builder = StringBuilder(val1)
+    builder.append(val2)
+    return LazyString(builder)
+
+
+class CharBuffer:
+    """
+    String variable modified by SETCHAR, characters are kept in list, so SETCHAR does not copy whole string
+    GETCHAR, STRI2INT and STRLEN read buffer directly, other instructions join it back into flat string
+    """
+    __slots__ = ('chars',)
+
+    def __init__(self, text):
+        self.chars = list(text)
+
+    def __len__(self):
+        return len(self.chars)
+
+    def __getitem__(self, index):
+        return self.chars[index]
+
+    def __str__(self):
+        return ''.join(self.chars)
+
+    def __repr__(self):
+        return repr(str(self))
 
 
 class Frame:
     """
     Class representing frame memory object
+    Variables are resolved to slots at load time, so frame is list indexed by slot
+    :param size: Number of slots
     """
-    def __init__(self):
-        self.values = {}
+    __slots__ = ('values',)
 
-    def push(self, value):
-        self.values[value] = None
+    def __init__(self, size=0):
+        self.values = [UNDECLARED] * size
 
-    def pop(self):
-        try:
-            for k, v in self.values.items():
-                return v.pop()
-        except IndexError:
-            sys.exit(55)
+
+class FramePool:
+    """
+    Class recycling local frames, so CREATEFRAME does not allocate new frame on every call
+    Only frames dropped from TF are released, nothing else can reference them at that point
+    :param size: Number of slots of local frame
+    :param limit: Maximal number of free frames kept in pool
+    """
+    __slots__ = ('blank', 'limit', 'free', 'hits', 'misses')
+
+    def __init__(self, size=0, limit=64):
+        self.blank = [UNDECLARED] * size
+        self.limit = limit
+        self.free = []
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self):
+        if self.free:
+            self.hits += 1
+            return self.free.pop()
+        self.misses += 1
+        return Frame(len(self.blank))
+
+    def release(self, frame):
+        if len(self.free) < self.limit:
+            frame.values[:] = self.blank
+            self.free.append(frame)
+
+    def hitRate(self):
+        """
+        Returns share of frames taken from pool
+        :return: Hit rate from 0 to 1
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
 
 
 class FrameStack:
@@ -56,7 +262,7 @@ class FrameStack:
 
     def pop(self):
         if len(self.frames) <= 0:
-            sys.exit(55)
+            raise MissingFrameError()
         else:
             return self.frames.pop()
 
@@ -73,7 +279,7 @@ class CallStack:
 
     def pop(self):
         if len(self.values) <= 0:
-            sys.exit(56)
+            raise MissingValueError()
         else:
             return self.values.pop()
 
@@ -81,63 +287,182 @@ class CallStack:
 class DataStack:
     """
     Class representing DataStack for *S Instructions
+    Values are native, so they are not wrapped into anything on push and unwrapped on pop
     """
     def __init__(self):
         self.values = []
 
-    def push(self, type, val):
-        self.values.append((type, val))
+    def push(self, val):
+        self.values.append(val)
 
     def pop(self):
         if len(self.values) <= 0:
-            sys.exit(56)
+            raise MissingValueError()
         else:
             return self.values.pop()
 
+    def popTwo(self):
+        """
+        Pops operands of binary stack instruction at once
+        :return: Second value from top, top value
+        """
+        values = self.values
+        if len(values) < 2:
+            raise MissingValueError()
+        val2 = values.pop()
+        return values.pop(), val2
+
+
+class Op:
+    """
+    Class representing one ready-to-run entry of the compiled program
+    Operands are pre-decoded into (type, frame, value) tuples and jump targets are resolved to program indices,
+    value of variable operand is its slot in frame
+    Handler may be replaced by quickened variant, generic handler is kept for de-optimization
+    Superinstruction keeps instructions it was fused from in parts
+    """
+    __slots__ = ('name', 'handler', 'generic', 'arg1', 'arg2', 'arg3', 'target', 'parts')
+
+    def __init__(self, name, handler, arg1=None, arg2=None, arg3=None, target=None):
+        self.name = name
+        self.handler = handler
+        self.generic = handler
+        self.arg1 = arg1
+        self.arg2 = arg2
+        self.arg3 = arg3
+        self.target = target
+        self.parts = None
+
+
+def nilArg(arg):
+    """
+    Puts NIL back into nil constant of program image
+    :param arg: Operand tuple or None
+    :return: Operand tuple or None
+    """
+    if arg is not None and arg[0] == 'nil':
+        return 'nil', None, NIL
+    return arg
+
+
+def decodeArg(arg):
+    """
+    Turns instruction argument object into operand tuple used by compiled program
+    Constants are converted into native values, so they are not parsed again during interpreting
+    :param arg: Instruction argument object
+    :return: Tuple (type, frame, value) or None if argument is not present
+    """
+    if arg is None or arg.type is None:
+        return None
+    if arg.type == 'int':
+        return arg.type, None, int(arg.value)
+    if arg.type == 'bool':
+        return arg.type, None, arg.value == 'true'
+    if arg.type == 'nil':
+        return arg.type, None, NIL
+    return arg.type, arg.frame, arg.value
+
+
+# quickening specializations, instruction -> (operand types fast handler may be specialized for, operation)
+QUICKBINARY = {
+    'ADD': ((int,), operator.add),
+    'SUB': ((int,), operator.sub),
+    'MUL': ((int,), operator.mul),
+    'IDIV': ((int,), operator.floordiv),
+    'LT': ((int, str, bool), operator.lt),
+    'GT': ((int, str, bool), operator.gt),
+    'EQ': ((int, str, bool, Nil), operator.eq),
+    'AND': ((bool,), operator.and_),
+    'OR': ((bool,), operator.or_),
+    'CONCAT': ((str,), operator.add),
+}
+QUICKUNARY = {
+    'NOT': (bool, operator.not_),
+    'STRLEN': (str, len),
+    'INT2CHAR': (int, chr),
+}
+QUICKINDEX = {
+    'GETCHAR': operator.getitem,
+    'STRI2INT': lambda s, i: ord(s[i]),
+}
+QUICKENED = list(QUICKBINARY) + list(QUICKUNARY) + list(QUICKINDEX) + \
+    ['MOVE', 'PUSHS', 'POPS', 'WRITE', 'READ', 'JUMPIFEQ', 'JUMPIFNEQ']
+
+# instructions producing bool, which may be fused with following conditional jump testing their result
+TESTS = ['LT', 'GT', 'EQ', 'AND', 'OR', 'NOT']
+
+# instructions storing result into arg1 variable without reading it
+STORES = ['MOVE', 'DEFVAR', 'POPS', 'ADD', 'SUB', 'MUL', 'IDIV', 'LT', 'GT', 'EQ', 'AND', 'OR', 'NOT',
+          'INT2CHAR', 'STRI2INT', 'READ', 'CONCAT', 'STRLEN', 'GETCHAR', 'TYPE']
+# tests fused with jump which get compare-and-branch fast path
+COMPARES = {'LT': operator.lt, 'GT': operator.gt, 'EQ': operator.eq}
+
+# longest body of subroutine inlined into its calls
+INLINEMAX = 8
+# instructions which can not be part of inlined body, they change or need counter or may be executed again by step()
+NOINLINE = ['JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS', 'CALL', 'READ', 'BREAK']
+
 
 class InstructionHandler:
     """
-    Main class representing InstructionHandler object as singleton design pattern
+    Main class representing virtual machine running one program
+    Every run has its own instance, errors are raised as IPPError and EXIT raises ProgramExit.
+    Output of program goes to given binary stream, stdout is used if it is None
     """
-    def __init__(self):
+    def __init__(self, output=None):
 
-        self.ins = None
+        self.program = []
 
         self.GF = Frame()
         self.LF = None
         self.TF = None
+        # raised whenever TF is replaced, pooled frame may come back as the same object, so identity can not tell it
+        self.tfVersion = 0
 
         self.dataStack = DataStack()
         self.callStack = CallStack()
         self.frameStack = FrameStack()
+        self.framePool = FramePool()
 
         self.labels = {}
+        # slots of variables, GF has its own layout, LF and TF share one because TF becomes LF
+        self.gfSlots = {}
+        self.localSlots = {}
         self.counter = 0
         self.executed = 0
         self.input = None
+        self.output = Output(output)
+        self.optimizations = []  # descriptions of applied load-time optimizations
+        self.memo = None  # Memoizer of pure subroutines, only reference engine uses it
+        # CONCAT creates LazyString and SETCHAR CharBuffer values, only reference engine handles them
+        self.lazyStrings = False
 
-    def printMemory(self):
+    def printMemory(self, op):
         """
         Debug function to print contents of frames and stacks
+        :param op: Compiled instruction being executed
         :return: Nothing
         """
         tabs = '\t' * 3
         frame = '-' * 60
+        args = [self.argName(arg) for arg in (op.arg1, op.arg2, op.arg3)]
+        self.output.flush()
         print('\n' + frame, file=sys.stderr)
-        print(f"| INS {tabs}| {self.ins.name} {self.ins.arg1.value} {self.ins.arg2.value} {self.ins.arg3.value}",
+        print(f"| INS {tabs}| {op.name} {args[0]} {args[1]} {args[2]}",
               file=sys.stderr)
-        print(f"| GF{tabs}| {self.GF.values}", file=sys.stderr)
-        try:
-            print(f"| LF{tabs}| {self.LF.values}", file=sys.stderr)
-        except AttributeError:
+        print(f"| GF{tabs}| {self.frameValues(self.GF, self.gfSlots)}", file=sys.stderr)
+        # missing frame is not the same as empty one, without local variables in program both would print {}
+        if self.LF is None:
             print(f"| LF{tabs}| <EMPTY>", file=sys.stderr)
-        try:
-            print(f"| TF{tabs}| {self.TF.values}", file=sys.stderr)
-        except AttributeError:
+        else:
+            print(f"| LF{tabs}| {self.frameValues(self.LF, self.localSlots)}", file=sys.stderr)
+        if self.TF is None:
             print(f"| TF{tabs}| <EMPTY>", file=sys.stderr)
+        else:
+            print(f"| TF{tabs}| {self.frameValues(self.TF, self.localSlots)}", file=sys.stderr)
 
         print(f"| DataStack\t\t| {self.dataStack.values}", file=sys.stderr)
-        print(f"| FrameStack\t| {[self.frameStack.frames[x].values for x in range(len(self.frameStack.frames))]}",
+        print(f"| FrameStack\t| {[self.frameValues(f, self.localSlots) for f in self.frameStack.frames]}",
               file=sys.stderr)
         print(f"| CallStack\t\t| {self.callStack.values}", file=sys.stderr)
         print(f"| Labels\t\t| {self.labels}", file=sys.stderr)
@@ -145,749 +470,1064 @@ class InstructionHandler:
         print(f"| Executed INS\t| {self.executed}", file=sys.stderr)
         print(frame + '\n', file=sys.stderr)
 
-    def checkInstruction(self, ins):
+    def argName(self, arg):
         """
-        Calls respective method to handle instruction based on its name
-        :param ins: Instruction object
-        :return: Nothing
+        Returns operand as it was written in source, variable slots are turned back into names
+        :param arg: Operand tuple
+        :return: Name of variable or value of constant
+        """
+        if arg is None:
+            return None
+        argtype, frame, value = arg
+        if argtype != 'var':
+            return value
+        slots = self.gfSlots if frame == 'GF' else self.localSlots
+        for name, slot in slots.items():
+            if slot == value:
+                return name
+
+    def frameValues(self, frame, slots):
+        """
+        Returns declared variables of frame as dict, used for debug output
+        :param frame: Frame object
+        :param slots: Layout of frame {name: slot}
+        :return: Dict {name: value}
         """
-        self.ins = ins
-        # call function based on instruction name
-        method = getattr(InstructionHandler, self.ins.name)
-        method(self)
+        return {name: frame.values[slot] for name, slot in slots.items() if frame.values[slot] is not UNDECLARED}
+
+    def resolve(self, arg):
+        """
+        Replaces variable name in operand with its slot, new names get next free slot of frame layout
+        :param arg: Operand tuple
+        :return: Operand tuple
+        """
+        if arg is None or arg[0] != 'var':
+            return arg
+        argtype, frame, name = arg
+        slots = self.gfSlots if frame == 'GF' else self.localSlots
+        return argtype, frame, slots.setdefault(name, len(slots))
 
     def checkDefined(self, arg):
         """
         Checks if argument variable is defined on given frame {GF, LF, TF}
-        :param arg: Instruction argument object
+        :param arg: Operand tuple
         :return: True if present
         """
+        _, frame, slot = arg
         try:
-            if arg.value in self.__dict__[arg.frame].values:
-                return True
-            else:
-                return False
+            return self.__dict__[frame].values[slot] is not UNDECLARED
         except AttributeError:
-            sys.exit(55)
+            raise MissingFrameError()
 
     def moveFromFrame(self, arg):
         """
         Returns value of variable in given frame {GF, LF, TF}
-        :param arg: Instruction argument object
+        :param arg: Operand tuple
         :return: Value of variable on given frame
         """
+        _, frame, slot = arg
         try:
-            return self.__dict__[arg.frame].values[arg.value]
-        # nonexistent variable
-        except KeyError:
-            sys.exit(54)
+            value = self.__dict__[frame].values[slot]
         # nonexistent frame
         except AttributeError:
-            sys.exit(55)
+            raise MissingFrameError()
+        # nonexistent variable
+        if value is UNDECLARED:
+            raise UndefinedVariableError()
+        return value
 
-    def checkArg1Var(self):
+    def checkArg1Var(self, op):
         """
         Checks if arg1 is type var and calls checkDefined() method to check if variable is defined
         Used in almost every instruction method
+        :param op: Compiled instruction
         :return: Nothing
         """
-        if self.ins.arg1.type != 'var':
-            sys.exit(53)
-        if not self.checkDefined(self.ins.arg1):
-            sys.exit(54)
+        if op.arg1[0] != 'var':
+            raise OperandTypeError()
+        if not self.checkDefined(op.arg1):
+            raise UndefinedVariableError()
 
-    def getSymb(self, typeref=None, arg=None):
+    def getSymb(self, typeref=None, arg=None, lazy=False, chars=False):
         """
         Returns either variable or symbol type its value
         :param typeref: Reference type(s)
-        :param arg: Instruction argument object
-        :return: Type of argument, value of argument
+        :param arg: Operand tuple
+        :param lazy: LazyString is returned as it is instead of flat string
+        :param chars: CharBuffer is returned as it is instead of flat string
+        :return: Type of argument, value of argument (type is None for uninitialized variable)
         """
         if typeref is None:
             typeref = []
         if arg is None:
             return None
-        if arg.type in typeref or arg.type == 'var':
-            if arg.type == 'var':
-                try:
-                    type, val = self.moveFromFrame(arg)
-                    if type not in typeref:
-                        sys.exit(53)
-                except TypeError:
-                    type = None
-                    val = arg.value
+        argtype, frame, val = arg
+        if argtype == 'var':
+            slot = val
+            val = self.moveFromFrame(arg)
+            if val is None:
+                return None, None
+            if type(val) is LazyString:
+                if not lazy:
+                    val = str(val)
+                valtype = 'string'
+            elif type(val) is CharBuffer:
+                if not chars:
+                    # joined string replaces buffer, next SETCHAR creates new one
+                    val = str(val)
+                    self.__dict__[frame].values[slot] = val
+                valtype = 'string'
             else:
-                try:
-                    val = arg.value
-                    type = arg.type
-                except TypeError:
-                    sys.exit(54)
+                valtype = typeOf(val)
+            if valtype not in typeref:
+                raise OperandTypeError()
+        elif argtype in typeref:
+            valtype = argtype
         else:
-            sys.exit(53)
-        return type, val
+            raise OperandTypeError()
+        return valtype, val
 
-    def getSymbs(self, typeref1, typeref2, arg2=None, arg3=None):
+    def getSymbs(self, typeref1, typeref2, arg2=None, arg3=None, lazy=False):
         """
         Same as getSymb(), but for 2 arguments at once
         :param typeref1: Reference type(s)
         :param typeref2: Reference type(s)
-        :param arg2: Instruction argument object
-        :param arg3: Instruction argument object
+        :param arg2: Operand tuple
+        :param arg3: Operand tuple
+        :param lazy: LazyString values are returned as they are
         :return: Type of argument, value of argument1, value of argument2
         """
-        type1, val1 = self.getSymb(typeref1, arg2)
-        type2, val2 = self.getSymb(typeref2, arg3)
+        type1, val1 = self.getSymb(typeref1, arg2, lazy)
+        type2, val2 = self.getSymb(typeref2, arg3, lazy)
         #  if types are incompatible -> error
         if type1 is None or type2 is None:
-            sys.exit(56)
+            raise MissingValueError()
         if type1 == type2:
             return type1, val1, val2
         else:
-            sys.exit(53)
+            raise OperandTypeError()
 
-    def moveToVar(self, type, value):
+    def moveToVar(self, op, value):
         """
-        Moves variable type and its value in form of tuple into variable defined in arg1 of instruction
-        :param type: Type of variable
-        :param value: Value of variable
+        Moves native value into variable defined in arg1 of instruction
+        :param op: Compiled instruction
+        :param value: Value of variable (int, bool, str or NIL)
         :return: Nothing
         """
-        value = str(value)
-        try:
-            self.checkDefined(self.ins.arg1)
-        except AttributeError:
-            sys.exit(54)
-        self.__dict__[self.ins.arg1.frame].values[self.ins.arg1.value] = (type, value)
+        _, frame, slot = op.arg1
+        self.__dict__[frame].values[slot] = value
+
+    def quickOperand(self, arg):
+        """
+        Returns where fast handler reads operand from, only GF variables and constants are specialized,
+        because GF is the only frame which is never replaced
+        :param arg: Operand tuple
+        :return: Sequence, index and kind name or None if operand can not be specialized
+        """
+        if arg[0] == 'var':
+            if arg[1] != 'GF':
+                return None
+            return self.GF.values, arg[2], 'GF'
+        return (arg[2],), 0, 'C'
+
+    def quicken(self, op):
+        """
+        Handler of instruction which was not executed yet
+        Runs generic handler and rewrites instruction into variant specialized for seen operand types
+        :param op: Compiled instruction
+        :return: Nothing
+        """
+        # types are taken before execution, destination may be one of operands
+        seen = []
+        for arg in (op.arg1, op.arg2, op.arg3):
+            operand = self.quickOperand(arg) if arg is not None else None
+            seen.append(type(operand[0][operand[1]]) if operand is not None else None)
+        op.generic(op)
+        fast = self.specialize(op, seen)
+        op.handler = op.generic if fast is None else fast
+
+    def specialize(self, op, seen):
+        """
+        Creates fast handler for instruction, it only checks cheap guard and
+        de-optimizes instruction back to generic handler when guard fails
+        :param op: Compiled instruction
+        :param seen: Types of operand values seen in first execution
+        :return: Fast handler or None if instruction can not be specialized
+        """
+        name = op.name
+        generic = op.generic
+        if name == 'CONCAT' and self.lazyStrings:
+            # generic CONCAT appends to lazy strings, flat fast path would copy them again
+            return None
+        if name in ['PUSHS', 'WRITE']:
+            operands = [self.quickOperand(op.arg1)]
+        else:
+            operands = [self.quickOperand(arg) for arg in (op.arg2, op.arg3) if arg is not None]
+        if None in operands:
+            return None
+        kinds = '_'.join(kind for _, _, kind in operands)
+
+        if name in ['JUMPIFEQ', 'JUMPIFNEQ']:
+            (m2, k2, _), (m3, k3, _) = operands
+            t = seen[1]
+            if op.target is None or t is not seen[2] or t not in TYPENAMES:
+                return None
+            target = op.target
+            equal = name == 'JUMPIFEQ'
+
+            def fast(op):
+                a = m2[k2]
+                b = m3[k3]
+                if type(a) is t and type(b) is t:
+                    if (a == b) is equal:
+                        self.counter = target
+                    return
+                op.handler = generic
+                generic(op)
+            fast.__name__ = f'{name}_{TYPENAMES[t].upper()}_{kinds}'
+            return fast
+
+        if name == 'PUSHS':
+            (m1, k1, _), = operands
+
+            def fast(op):
+                a = m1[k1]
+                if a is not None and a is not UNDECLARED and type(a) is not LazyString and type(a) is not CharBuffer:
+                    self.dataStack.values.append(a)
+                    return
+                op.handler = generic
+                generic(op)
+            fast.__name__ = f'{name}_{kinds}'
+            return fast
+
+        if name == 'WRITE':
+            (m1, k1, _), = operands
+            write = self.output.write
+
+            def fast(op):
+                a = m1[k1]
+                if a is not None and a is not UNDECLARED:
+                    write(toString(a))
+                    return
+                op.handler = generic
+                generic(op)
+            fast.__name__ = f'{name}_{kinds}'
+            return fast
+
+        # all remaining instructions store result into arg1 variable
+        if op.arg1[0] != 'var' or op.arg1[1] != 'GF':
+            return None
+        gv = self.GF.values
+        dest = op.arg1[2]
+
+        if name == 'POPS':
+            def fast(op):
+                values = self.dataStack.values
+                if values and gv[dest] is not UNDECLARED:
+                    gv[dest] = values.pop()
+                    return
+                op.handler = generic
+                generic(op)
+            fast.__name__ = f'{name}_GF'
+            return fast
+
+        if name == 'READ':
+            kind = op.arg2[2]
+            if op.arg2[0] != 'type' or kind not in ['int', 'string', 'bool']:
+                return None
+            readline = self.input.readline
+
+            def fast(op):
+                if gv[dest] is not UNDECLARED:
+                    gv[dest] = readValue(readline(), kind)
+                    return
+                op.handler = generic
+                generic(op)
+            fast.__name__ = f'{name}_{kind.upper()}_GF'
+            return fast
+
+        if name == 'MOVE':
+            (m2, k2, _), = operands
+
+            def fast(op):
+                a = m2[k2]
+                # CharBuffer is mutable, copy of variable has to be flat string
+                if a is not None and a is not UNDECLARED and type(a) is not CharBuffer and gv[dest] is not UNDECLARED:
+                    gv[dest] = a
+                    return
+                op.handler = generic
+                generic(op)
+            fast.__name__ = f'{name}_GF_{kinds}'
+            return fast
+
+        if name in QUICKUNARY:
+            (m2, k2, _), = operands
+            t, func = QUICKUNARY[name]
+            if seen[1] is not t:
+                return None
+
+            def fast(op):
+                a = m2[k2]
+                if type(a) is t and gv[dest] is not UNDECLARED:
+                    try:
+                        gv[dest] = func(a)
+                        return
+                    except (ValueError, OverflowError):
+                        pass
+                op.handler = generic
+                generic(op)
+            fast.__name__ = f'{name}_{TYPENAMES[t].upper()}_GF_{kinds}'
+            return fast
+
+        (m2, k2, _), (m3, k3, _) = operands
+        if name in QUICKINDEX:
+            func = QUICKINDEX[name]
+            if seen[1] is not str or seen[2] is not int:
+                return None
+
+            def fast(op):
+                a = m2[k2]
+                b = m3[k3]
+                if type(a) is str and type(b) is int and 0 <= b < len(a) and gv[dest] is not UNDECLARED:
+                    gv[dest] = func(a, b)
+                    return
+                op.handler = generic
+                generic(op)
+            fast.__name__ = f'{name}_STRING_INT_GF_{kinds}'
+            return fast
+
+        types, func = QUICKBINARY[name]
+        t = seen[1]
+        if t is not seen[2] or t not in types:
+            return None
+
+        def fast(op):
+            a = m2[k2]
+            b = m3[k3]
+            if type(a) is t and type(b) is t and gv[dest] is not UNDECLARED:
+                try:
+                    gv[dest] = func(a, b)
+                    return
+                except ZeroDivisionError:
+                    pass
+            op.handler = generic
+            generic(op)
+        fast.__name__ = f'{name}_{TYPENAMES[t].upper()}_GF_{kinds}'
+        return fast
+
+    def peekSymb(self, arg):
+        """
+        Returns value of symbol without any checks, used by fast paths of superinstructions
+        :param arg: Operand tuple
+        :return: Native value, None or UNDECLARED if value is missing, uninitialized or operand is not symbol
+        """
+        argtype, frame, value = arg
+        if argtype in ['int', 'string', 'bool', 'nil']:
+            return value
+        if argtype != 'var' or self.__dict__[frame] is None:
+            return None
+        return self.__dict__[frame].values[value]
+
+    def fusion(self, i):
+        """
+        Finds superinstruction for sequence of instructions starting at given index
+        :param i: Index of first instruction
+        :return: Fused handler and number of fused instructions, or None
+        """
+        ops = self.program[i:i + 3]
+        names = [op.name for op in ops]
+        if names == ['CREATEFRAME', 'PUSHFRAME', 'CALL'] and ops[2].target is not None:
+            return self.CREATEFRAME_PUSHFRAME_CALL, 3
+        if names[:2] == ['PUSHS', 'PUSHS'] and len(names) == 3 and names[2][:-1] in QUICKBINARY \
+                and names[2].endswith('S'):
+            return self.PUSHS_PUSHS_STACK, 3
+        if names[:2] == ['DEFVAR', 'MOVE'] and ops[0].arg1 == ops[1].arg1:
+            return self.runParts, 2
+        if len(names) >= 2 and names[0] in TESTS and names[1] in ['JUMPIFEQ', 'JUMPIFNEQ'] \
+                and ops[0].arg1[0] == 'var' and ops[1].target is not None:
+            test, jump = ops[:2]
+            # jump has to compare result of test with bool constant
+            if jump.arg2 == test.arg1 and jump.arg3[0] == 'bool':
+                return self.TEST_JUMP, 2
+            if jump.arg3 == test.arg1 and jump.arg2[0] == 'bool':
+                return self.TEST_JUMP, 2
+        return None
+
+    def isDead(self, ops, arg, starts):
+        """
+        Checks if variable is overwritten on every path from given instructions before it is read
+        Only GF variables are checked, paths through RETURN or BREAK count as reads
+        :param ops: Program without superinstructions
+        :param arg: Variable operand
+        :param starts: Indices where paths start
+        :return: True if value of variable is never read
+        """
+        if arg[1] != 'GF':
+            return False
+        seen = set()
+        work = list(starts)
+        while work:
+            i = work.pop()
+            if i is None or i in seen or i >= len(ops):
+                # missing label ends program with error, end of program does not read anything
+                continue
+            seen.add(i)
+            op = ops[i]
+            if op.name in ['RETURN', 'BREAK'] or arg in (op.arg2, op.arg3):
+                return False
+            if op.arg1 == arg:
+                if op.name in STORES:
+                    continue
+                return False
+            if op.name == 'EXIT':
+                continue
+            if op.name in ['JUMP', 'CALL']:
+                work.append(op.target)
+                continue
+            if op.name in ['JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS']:
+                work.append(op.target)
+            work.append(i + 1)
+        return True
+
+    def compareJump(self, op, dead):
+        """
+        Creates compare-and-branch fast handler of fused LT, GT or EQ and conditional jump
+        Ints and strings are compared directly, result is not stored if it is dead, other cases and missing
+        values go through generic TEST_JUMP
+        :param op: Fused TEST_JUMP instruction
+        :param dead: Result of test is never read
+        :return: Fast handler or None if operands can not be specialized
+        """
+        test = op.parts[0]
+        if test.name not in COMPARES or test.arg1[1] != 'GF':
+            return None
+        operands = [self.quickOperand(test.arg2), self.quickOperand(test.arg3)]
+        if None in operands:
+            return None
+        (m2, k2, _), (m3, k3, _) = operands
+        kinds = '_'.join(kind for _, _, kind in operands)
+        func = COMPARES[test.name]
+        gv = self.GF.values
+        dest = test.arg1[2]
+        taken = op.arg2[2]
+        target = op.target
+        generic = self.TEST_JUMP
+
+        def fast(op):
+            a = m2[k2]
+            b = m3[k3]
+            t = type(a)
+            if t is type(b) and (t is int or t is str) and gv[dest] is not UNDECLARED:
+                result = func(a, b)
+                if not dead:
+                    gv[dest] = result
+                if result is taken:
+                    self.counter = target
+                else:
+                    self.counter += 1
+                self.executed += 1
+                return
+            generic(op)
+        fast.__name__ = f'{test.name}_JUMP_{kinds}'
+        return fast
+
+    def fuse(self):
+        """
+        Load-time pass replacing common sequences of instructions with superinstructions
+        Fused instructions stay in program on their places, so jumps and returns into them still work,
+        superinstruction only runs them without going through main loop
+        :return: Nothing
+        """
+        ops = [op.parts[0] if op.parts else op for op in self.program]
+        i = 1
+        while i < len(self.program):
+            found = self.fusion(i)
+            if found is None:
+                i += 1
+                continue
+            handler, count = found
+            parts = self.program[i:i + count]
+            name = '_'.join(op.name for op in parts)
+            op = Op(name, handler, parts[0].arg1, None, None, parts[-1].target)
+            op.parts = parts
+            if handler == self.TEST_JUMP:
+                # jump is taken when result of test is this value
+                test, jump = parts
+                const = jump.arg3 if jump.arg2 == test.arg1 else jump.arg2
+                op.arg2 = ('bool', None, const[2] == (jump.name == 'JUMPIFEQ'))
+                dead = self.isDead(ops, test.arg1, [jump.target, i + 2])
+                fast = self.compareJump(op, dead)
+                if fast is not None:
+                    op.handler = fast
+                    if dead:
+                        self.optimizations.append(f'dead result GF@{self.argName(test.arg1)} of {test.name} at {i} '
+                                                  f'is not stored')
+            self.program[i] = op
+            self.optimizations.append(f'fused {name} at {i}-{i + count - 1}')
+            i += count
+
+    def inlineBody(self, target):
+        """
+        Returns body of subroutine if it is small leaf, which is straight line of instructions ending with RETURN
+        :param target: Index of subroutine entry
+        :return: List of instructions from entry label to RETURN (not included) or None
+        """
+        size = 0
+        for i in range(target + 1, len(self.program)):
+            op = self.program[i]
+            if op.name == 'RETURN':
+                return self.program[target:i]
+            if op.name in NOINLINE or op.parts is not None or size == INLINEMAX:
+                return None
+            if op.name != 'LABEL':
+                size += 1
+        return None
+
+    def tailTarget(self, i):
+        """
+        Checks if call returns right after subroutine returns, labels and jumps between call and RETURN are followed
+        :param i: Index of CALL
+        :return: True if call may be replaced by jump
+        """
+        seen = set()
+        i += 1
+        while i < len(self.program) and i not in seen:
+            seen.add(i)
+            op = self.program[i]
+            if op.name == 'RETURN':
+                return True
+            if op.name == 'LABEL':
+                i += 1
+            elif op.name == 'JUMP' and op.target is not None:
+                i = op.target
+            else:
+                return False
+        return False
+
+    def optimizeCalls(self):
+        """
+        Load-time pass inlining small leaf subroutines into their calls and turning tail calls into jumps
+        Call followed by RETURN does not need its own return address, subroutine returns straight to the caller
+        of current one, so tail recursion runs in constant call stack
+        Inlined call keeps original CALL as first part, so program before inlining can be still read from parts
+        :return: Nothing
+        """
+        for i, op in enumerate(self.program):
+            if op.name != 'CALL' or op.target is None:
+                continue
+            body = self.inlineBody(op.target)
+            if body is not None:
+                inlined = Op('INLINE', self.INLINE, op.arg1, None, None, op.target)
+                inlined.parts = [op] + body
+                self.program[i] = inlined
+                self.optimizations.append(f'inlined subroutine at {op.target} into call at {i}')
+            elif self.tailTarget(i):
+                self.program[i] = Op('JUMP', self.JUMP, op.arg1, None, None, op.target)
+                self.optimizations.append(f'tail call at {i} turned into jump to {op.target}')
+
+    def runParts(self, op):
+        """
+        Runs instructions of superinstruction one by one, only last of them may change counter
+        :param op: Superinstruction
+        :return: Nothing
+        """
+        parts = op.parts
+        for part in parts[:-1]:
+            part.handler(part)
+        self.counter += len(parts) - 1
+        self.executed += len(parts) - 1
+        parts[-1].handler(parts[-1])
 
     """ALL METHODS IMPLEMENTED BELLOW HANDLE EACH ONE SPECIFIC INTRUCTION"""
-    def MOVE(self):
-        self.checkArg1Var()
-        type, val = self.getSymb(['int', 'string', 'bool', 'nil'], self.ins.arg2)
+    def MOVE(self, op):
+        self.checkArg1Var(op)
+        type, val = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg2, True)
         if type is None:
-            sys.exit(56)
-        if type == 'nil':
-            val = ''
-        self.moveToVar(type, val)
+            raise MissingValueError()
+        self.moveToVar(op, val)
 
-    def CREATEFRAME(self):
-        self.TF = Frame()
+    def CREATEFRAME(self, op):
+        if self.TF is not None:
+            self.framePool.release(self.TF)
+        self.TF = self.framePool.acquire()
+        self.tfVersion += 1
 
-    def PUSHFRAME(self):
+    def PUSHFRAME(self, op):
         if self.TF is not None:
             try:
                 self.LF = self.TF
                 self.frameStack.push(self.LF)
                 self.TF = None
+                self.tfVersion += 1
             except AttributeError:
-                sys.exit(55)
+                raise MissingFrameError()
         else:
-            sys.exit(55)
+            raise MissingFrameError()
 
-    def POPFRAME(self):
-        self.TF = self.frameStack.pop()
+    def POPFRAME(self, op):
+        frame = self.frameStack.pop()
+        if self.TF is not None:
+            self.framePool.release(self.TF)
+        self.TF = frame
+        self.tfVersion += 1
         try:
             self.LF = self.frameStack.frames[-1]
         except IndexError:
             self.LF = None
 
-    def DEFVAR(self):
-        if self.ins.arg1.type == 'var':
+    def DEFVAR(self, op):
+        if op.arg1[0] == 'var':
             try:
-                if not self.checkDefined(self.ins.arg1):
-                    self.__dict__[self.ins.arg1.frame].values[self.ins.arg1.value] = None
+                if not self.checkDefined(op.arg1):
+                    self.moveToVar(op, None)
                 else:
-                    sys.exit(52)
+                    raise SemanticError()
             except AttributeError:
-                sys.exit(55)
+                raise MissingFrameError()
         else:
-            sys.exit(53)
+            raise OperandTypeError()
 
-    def CALL(self):
+    def CALL(self, op):
         self.callStack.push(self.counter)
-        self.JUMP()
+        self.JUMP(op)
 
-    def RETURN(self):
+    def RETURN(self, op):
         self.counter = self.callStack.pop()
 
-    def PUSHS(self):
-        if self.ins.arg1.type == 'var':
-            self.checkArg1Var()
-        self.dataStack.push(self.ins.arg1.type, self.ins.arg1.value)
-
-    def POPS(self):
-        self.checkArg1Var()
-        if self.checkDefined(self.ins.arg1):
-            self.__dict__[self.ins.arg1.frame].values[self.ins.arg1.value] = self.dataStack.pop()
-
-    def ADD(self):
-        self.checkArg1Var()
+    def PUSHS(self, op):
+        type, val = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg1)
+        if type is None:
+            raise MissingValueError()
+        self.dataStack.push(val)
 
-        type, val1, val2 = self.getSymbs(['int'], ['int'], self.ins.arg2, self.ins.arg3)
+    def POPS(self, op):
+        self.checkArg1Var(op)
+        self.moveToVar(op, self.dataStack.pop())
 
-        try:
-            val = int(val1) + int(val2)
-        except ValueError:
-            sys.exit(53)
+    def ADD(self, op):
+        self.checkArg1Var(op)
 
-        self.moveToVar(type, val)
+        _, val1, val2 = self.getSymbs(['int'], ['int'], op.arg2, op.arg3)
 
-    def SUB(self):
-        self.checkArg1Var()
+        self.moveToVar(op, val1 + val2)
 
-        type, val1, val2 = self.getSymbs(['int'], ['int'], self.ins.arg2, self.ins.arg3)
-
-        try:
-            val = int(val1) - int(val2)
-        except ValueError:
-            sys.exit(53)
+    def SUB(self, op):
+        self.checkArg1Var(op)
 
-        self.moveToVar(type, val)
+        _, val1, val2 = self.getSymbs(['int'], ['int'], op.arg2, op.arg3)
 
-    def MUL(self):
-        self.checkArg1Var()
+        self.moveToVar(op, val1 - val2)
 
-        type, val1, val2 = self.getSymbs(['int'], ['int'], self.ins.arg2, self.ins.arg3)
+    def MUL(self, op):
+        self.checkArg1Var(op)
 
-        try:
-            val = int(val1) * int(val2)
-        except ValueError:
-            sys.exit(53)
+        _, val1, val2 = self.getSymbs(['int'], ['int'], op.arg2, op.arg3)
 
-        self.moveToVar(type, val)
+        self.moveToVar(op, val1 * val2)
 
-    def IDIV(self):
-        self.checkArg1Var()
+    def IDIV(self, op):
+        self.checkArg1Var(op)
 
-        type, val1, val2 = self.getSymbs(['int'], ['int'], self.ins.arg2, self.ins.arg3)
+        _, val1, val2 = self.getSymbs(['int'], ['int'], op.arg2, op.arg3)
 
         try:
-            val = int(val1) // int(val2)
-        except ValueError:
-            sys.exit(53)
+            val = val1 // val2
         except ZeroDivisionError:
-            sys.exit(57)
+            raise OperandValueError()
 
-        self.moveToVar(type, val)
+        self.moveToVar(op, val)
 
-    def LTGT(self):
-        self.checkArg1Var()
-        if self.ins.arg2.type == 'nil' or self.ins.arg3.type == 'nil':
-            sys.exit(53)
+    def LTGT(self, op):
+        self.checkArg1Var(op)
 
-        _, val1, val2 = self.getSymbs(['int', 'string', 'bool'], ['int', 'string', 'bool'], self.ins.arg2,
-                                      self.ins.arg3)
+        _, val1, val2 = self.getSymbs(['int', 'string', 'bool'], ['int', 'string', 'bool'], op.arg2,
+                                      op.arg3)
         return val1, val2
 
-    def LT(self):
-        val1, val2 = self.LTGT()
-        try:
-            val = val1 < val2
-        except ValueError:
-            sys.exit(53)
-
-        val = str(val).lower()
-        self.moveToVar('bool', val)
-
-    def GT(self):
-        val1, val2 = self.LTGT()
-        try:
-            val = val1 > val2
-        except ValueError:
-            sys.exit(53)
+    def LT(self, op):
+        val1, val2 = self.LTGT(op)
+        self.moveToVar(op, val1 < val2)
 
-        val = str(val).lower()
-        self.moveToVar('bool', val)
+    def GT(self, op):
+        val1, val2 = self.LTGT(op)
+        self.moveToVar(op, val1 > val2)
 
-    def EQ(self):
-        self.checkArg1Var()
+    def EQ(self, op):
+        self.checkArg1Var(op)
 
-        type1, val1 = self.getSymb(['int', 'string', 'bool', 'nil'], self.ins.arg2)
-        type2, val2 = self.getSymb(['int', 'string', 'bool', 'nil'], self.ins.arg3)
+        type1, val1 = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg2)
+        type2, val2 = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg3)
 
         if type1 is None or type2 is None:
-            sys.exit(56)
+            raise MissingValueError()
         if type1 == type2:
-            try:
-                val = val1 == val2
-            except ValueError:
-                sys.exit(53)
-            val = str(val).lower()
-            self.moveToVar('bool', val)
+            self.moveToVar(op, val1 == val2)
         elif type1 == 'nil' or type2 == 'nil':
-            self.moveToVar('bool', 'false')
+            self.moveToVar(op, False)
         else:
-            sys.exit(53)
-
-    def ANDOR(self):
-        self.checkArg1Var()
-
-        _, val1, val2 = self.getSymbs(['bool'], ['bool'], self.ins.arg2, self.ins.arg3)
+            raise OperandTypeError()
 
-        if val1 == 'true':
-            val1 = True
-        elif val1 == 'false':
-            val1 = False
-        if val2 == 'true':
-            val2 = True
-        elif val2 == 'false':
-            val2 = False
+    def ANDOR(self, op):
+        self.checkArg1Var(op)
 
+        _, val1, val2 = self.getSymbs(['bool'], ['bool'], op.arg2, op.arg3)
         return val1, val2
 
-    def AND(self):
-        val1, val2 = self.ANDOR()
-        try:
-            val = val1 and val2
-            val = str(val).lower()
-        except ValueError:
-            sys.exit(53)
-
-        self.moveToVar('bool', val)
+    def AND(self, op):
+        val1, val2 = self.ANDOR(op)
+        self.moveToVar(op, val1 and val2)
 
-    def OR(self):
-        val1, val2 = self.ANDOR()
-        try:
-            val = val1 or val2
-            val = str(val).lower()
-        except ValueError:
-            sys.exit(53)
+    def OR(self, op):
+        val1, val2 = self.ANDOR(op)
+        self.moveToVar(op, val1 or val2)
 
-        self.moveToVar('bool', val)
+    def NOT(self, op):
+        self.checkArg1Var(op)
 
-    def NOT(self):
-        self.checkArg1Var()
-
-        type, val1 = self.getSymb(['bool'], self.ins.arg2)
-        if type is None:
-            sys.exit(56)
-        if type != 'bool':
-            sys.exit(53)
+        type, val1 = self.getSymb(['bool'], op.arg2)
         if type is None:
-            sys.exit(56)
+            raise MissingValueError()
 
-        if val1 == 'true':
-            val1 = True
-        elif val1 == 'false':
-            val1 = False
+        self.moveToVar(op, not val1)
 
-        try:
-            val = not val1
-            val = str(val)
-        except ValueError:
-            sys.exit(53)
-
-        self.moveToVar('bool', val.lower())
+    def INT2CHAR(self, op):
+        self.checkArg1Var(op)
 
-    def INT2CHAR(self):
-        self.checkArg1Var()
-
-        type, val1 = self.getSymb(['int'], self.ins.arg2)
+        type, val1 = self.getSymb(['int'], op.arg2)
         if type is None:
-            sys.exit(56)
+            raise MissingValueError()
         try:
-            val = chr(int(val1))
-        except ValueError:
-            sys.exit(58)
+            val = chr(val1)
+        except (ValueError, OverflowError):
+            raise StringError()
 
-        self.moveToVar('string', val)
+        self.moveToVar(op, val)
 
-    def STRI2INT(self):
-        self.checkArg1Var()
+    def STRI2INT(self, op):
+        self.checkArg1Var(op)
 
-        type1, val1 = self.getSymb(['string'], self.ins.arg2)
-        type2, val2 = self.getSymb(['int'], self.ins.arg3)
+        type1, val1 = self.getSymb(['string'], op.arg2, chars=True)
+        type2, val2 = self.getSymb(['int'], op.arg3)
 
         if type1 is None or type2 is None:
-            sys.exit(56)
+            raise MissingValueError()
+        if val2 < 0:
+            raise StringError()
         try:
-            val2 = int(val2)
-            if val2 < 0:
-                sys.exit(58)
             val = ord(val1[val2])
-        except ValueError:
-            sys.exit(58)
         except IndexError:
-            sys.exit(58)
+            raise StringError()
 
-        self.moveToVar('int', val)
+        self.moveToVar(op, val)
 
-    def READ(self):
-        self.checkArg1Var()
-        if self.ins.arg2.type != 'type':
-            sys.exit(53)
-        type = self.ins.arg2.value
-        if type in ['int', 'string', 'bool']:
-            line = str(self.input.readline().strip())
-        else:
-            sys.exit(53)
+    def READ(self, op):
+        self.checkArg1Var(op)
+        if op.arg2[0] != 'type':
+            raise OperandTypeError()
+        type = op.arg2[2]
+        if type not in ['int', 'string', 'bool']:
+            raise OperandTypeError()
+        self.moveToVar(op, readValue(self.input.readline(), type))
 
-        if type == 'bool':
-            line = line.lower()
-            if line != 'true':
-                line = 'false'
-        if type == 'int':
-            try:
-                line = str(int(line))
-            except ValueError:
-                type = 'nil'
-                line = 'nil'
-        if line == '' and type != 'string':
-            type = 'nil'
-            line = 'nil'
-        self.moveToVar(type, line)
-
-    def WRITE(self):
-        type, val1 = self.getSymb(['bool', 'int', 'string', 'nil'], self.ins.arg1)
+    def WRITE(self, op):
+        type, val1 = self.getSymb(['bool', 'int', 'string', 'nil'], op.arg1)
 
         if type is None:
-            sys.exit(56)
-        if type == 'nil':
-            print('', end='', sep='')
-        print(val1, end='', sep='')
-
-    def CONCAT(self):
-        self.checkArg1Var()
-
-        type, val1, val2 = self.getSymbs(['string'], ['string'], self.ins.arg2, self.ins.arg3)
+            raise MissingValueError()
+        self.output.write(toString(val1))
 
-        try:
-            val = val1 + val2
-            val = str(val)
-        except ValueError:
-            sys.exit(53)
+    def CONCAT(self, op):
+        self.checkArg1Var(op)
 
-        self.moveToVar(type, val.lower())
+        if self.lazyStrings:
+            _, val1, val2 = self.getSymbs(['string'], ['string'], op.arg2, op.arg3, True)
+            self.moveToVar(op, concat(val1, val2))
+        else:
+            _, val1, val2 = self.getSymbs(['string'], ['string'], op.arg2, op.arg3)
+            self.moveToVar(op, val1 + val2)
 
-    def STRLEN(self):
-        self.checkArg1Var()
+    def STRLEN(self, op):
+        self.checkArg1Var(op)
 
-        type, val1 = self.getSymb(['string'], self.ins.arg2)
+        type, val1 = self.getSymb(['string'], op.arg2, chars=True)
 
         if type is None:
-            sys.exit(56)
-        try:
-            val = len(str(val1))
-        except ValueError:
-            sys.exit(53)
+            raise MissingValueError()
 
-        self.moveToVar('int', val)
+        self.moveToVar(op, len(val1))
 
-    def GETCHAR(self):
-        self.checkArg1Var()
+    def GETCHAR(self, op):
+        self.checkArg1Var(op)
 
-        type1, val1 = self.getSymb(['string'], self.ins.arg2)
-        type2, val2 = self.getSymb(['int'], self.ins.arg3)
+        type1, val1 = self.getSymb(['string'], op.arg2, chars=True)
+        type2, val2 = self.getSymb(['int'], op.arg3)
 
+        if type1 is None or type2 is None:
+            raise MissingValueError()
+        if val2 < 0:
+            raise StringError()
         try:
-            val2 = int(val2)
-            if val2 < 0:
-                sys.exit(58)
             val = val1[val2]
-            val = str(val)
-        except ValueError:
-            sys.exit(58)
         except IndexError:
-            sys.exit(58)
+            raise StringError()
 
-        self.moveToVar('string', val.lower())
+        self.moveToVar(op, val)
 
-    def SETCHAR(self):
-        self.checkArg1Var()
+    def SETCHAR(self, op):
+        self.checkArg1Var(op)
 
-        type1, val1 = self.getSymb(['int'], self.ins.arg2)
-        type2, val2 = self.getSymb(['string'], self.ins.arg3)
+        type, string = self.getSymb(['string'], op.arg1, chars=self.lazyStrings)
+        type1, val1 = self.getSymb(['int'], op.arg2)
+        type2, val2 = self.getSymb(['string'], op.arg3)
 
-        try:
-            val = val1[int(val2)]
-            val = str(val)
-        except ValueError:
-            sys.exit(58)
-        except IndexError:
-            sys.exit(58)
-        self.moveToVar('string', val.lower())
+        if type is None or type1 is None or type2 is None:
+            raise MissingValueError()
+        if val1 < 0 or val1 >= len(string) or val2 == '':
+            raise StringError()
 
-    def TYPE(self):
-        self.checkArg1Var()
-        type, val1 = self.getSymb(['int', 'string', 'bool', 'nil'], self.ins.arg2)
+        if self.lazyStrings:
+            # string stays in buffer while it is modified in place
+            if not isinstance(string, CharBuffer):
+                string = CharBuffer(string)
+            string.chars[val1] = val2[0]
+            self.moveToVar(op, string)
+        else:
+            self.moveToVar(op, string[:val1] + val2[0] + string[val1 + 1:])
+
+    def TYPE(self, op):
+        self.checkArg1Var(op)
+        type, val1 = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg2)
 
         if type is None:
             type = ''
 
-        self.moveToVar('string', type)
+        self.moveToVar(op, type)
 
-    def LABEL(self):
+    def LABEL(self, op):
         # all labels are saved at the start of interpreting, so handler method is not needed
         pass
 
-    def JUMP(self):
-        try:
-            self.counter = self.labels[self.ins.arg1.value]
-        except KeyError:
-            sys.exit(52)
+    def JUMP(self, op):
+        if op.target is None:
+            raise SemanticError()
+        self.counter = op.target
 
-    def JUMPIFEQ(self):
-        type1, val1 = self.getSymb(['int', 'string', 'bool', 'nil'], self.ins.arg2)
-        type2, val2 = self.getSymb(['int', 'string', 'bool', 'nil'], self.ins.arg3)
+    def JUMPIFEQ(self, op):
+        type1, val1 = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg2)
+        type2, val2 = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg3)
 
         if type1 is None or type2 is None:
-            sys.exit(56)
+            raise MissingValueError()
         if type1 == type2:
-            try:
-                x = self.labels[self.ins.arg1.value]
-            except KeyError:
-                sys.exit(52)
+            if op.target is None:
+                raise SemanticError()
             if val1 == val2:
-                self.counter = x
+                self.counter = op.target
         elif type1 == 'nil' or type2 == 'nil':
             return
         else:
-            sys.exit(53)
+            raise OperandTypeError()
 
-    def JUMPIFNEQ(self):
-        type1, val1 = self.getSymb(['int', 'string', 'bool', 'nil'], self.ins.arg2)
-        type2, val2 = self.getSymb(['int', 'string', 'bool', 'nil'], self.ins.arg3)
+    def JUMPIFNEQ(self, op):
+        type1, val1 = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg2)
+        type2, val2 = self.getSymb(['int', 'string', 'bool', 'nil'], op.arg3)
 
         if type1 is None or type2 is None:
-            sys.exit(56)
+            raise MissingValueError()
         if type1 == type2:
-            try:
-                x = self.labels[self.ins.arg1.value]
-            except KeyError:
-                sys.exit(52)
+            if op.target is None:
+                raise SemanticError()
             if val1 != val2:
-                self.counter = x
+                self.counter = op.target
         elif type1 == 'nil' or type2 == 'nil':
-            try:
-                self.counter = self.labels[self.ins.arg1.value]
-            except KeyError:
-                sys.exit(52)
+            self.JUMP(op)
         else:
-            sys.exit(53)
+            raise OperandTypeError()
 
-    def EXIT(self):
-        if self.ins.arg1.type == 'int':
-            if 0 <= int(str(self.ins.arg1.value)) <= 49:
-                sys.exit(int(str(self.ins.arg1.value)))
-            else:
-                sys.exit(57)
-        elif self.ins.arg1.type == 'var':
-            if self.checkDefined(self.ins.arg1):
-                try:
-                    type, val = self.__dict__[self.ins.arg1.frame].values[self.ins.arg1.value]
-                except TypeError:
-                    sys.exit(56)
-                if type == 'int':
-                    val = int(str(val))
-                    if 0 <= val <= 49:
-                        sys.exit(val)
-                    else:
-                        sys.exit(57)
-                else:
-                    sys.exit(53)
-            else:
-                sys.exit(54)
+    def EXIT(self, op):
+        type, val = self.getSymb(['int'], op.arg1)
+
+        if type is None:
+            raise MissingValueError()
+        if 0 <= val <= 49:
+            raise ProgramExit(val)
         else:
-            sys.exit(53)
+            raise OperandValueError()
 
-    def DPRINT(self):
-        type, val1 = self.getSymb(['bool', 'int', 'string', 'nil'], self.ins.arg1)
+    def DPRINT(self, op):
+        type, val1 = self.getSymb(['bool', 'int', 'string', 'nil'], op.arg1)
 
         if type is None:
-            sys.exit(56)
-        if type == 'nil':
-            print('', file=sys.stderr, end='', sep='')
-        print(val1, file=sys.stderr, end='', sep='')
+            raise MissingValueError()
+        self.output.flush()
+        print(toString(val1), file=sys.stderr, end='', sep='')
 
-    def BREAK(self):
-        self.printMemory()
+    def BREAK(self, op):
+        self.printMemory(op)
 
     ### STACK INSTRUCTIONS ###
 
-    def CLEARS(self):
+    def CLEARS(self, op):
         self.dataStack.values = []
 
-    def ADDS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+    def ARITHS(self):
+        val1, val2 = self.dataStack.popTwo()
 
-        if type1 == type2:
-            val = int(val1) + int(val2)
-            self.dataStack.push(type1, val)
-        else:
-            sys.exit(53)
+        if type(val1) is not int or type(val2) is not int:
+            raise OperandTypeError()
 
-    def SUBS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+        return val1, val2
 
-        if type1 == type2:
-            val = int(val1) - int(val2)
-            self.dataStack.push(type1, val)
-        else:
-            sys.exit(53)
+    def ADDS(self, op):
+        val1, val2 = self.ARITHS()
+        self.dataStack.values.append(val1 + val2)
 
-    def MULS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+    def SUBS(self, op):
+        val1, val2 = self.ARITHS()
+        self.dataStack.values.append(val1 - val2)
 
-        if type1 == type2:
-            val = int(val1) * int(val2)
-            self.dataStack.push(type1, val)
-        else:
-            sys.exit(53)
+    def MULS(self, op):
+        val1, val2 = self.ARITHS()
+        self.dataStack.values.append(val1 * val2)
 
-    def IDIVS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+    def IDIVS(self, op):
+        val1, val2 = self.ARITHS()
+        try:
+            val = val1 // val2
+        except ZeroDivisionError:
+            raise OperandValueError()
+        self.dataStack.values.append(val)
 
-        if type1 == type2:
-            try:
-                val = int(val1) // int(val2)
-            except ZeroDivisionError:
-                sys.exit(57)
-            self.dataStack.push(type1, val)
-        else:
-            sys.exit(53)
+    def LTSGTS(self):
+        val1, val2 = self.dataStack.popTwo()
 
-    def LTS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+        type1 = type(val1)
+        if type1 is not type(val2) or type1 is Nil:
+            raise OperandTypeError()
 
-        if type1 == type2:
-            val = val1 < val2
-            val = str(val).lower()
-            self.dataStack.push('bool', val)
-        else:
-            sys.exit(53)
+        return val1, val2
 
-    def GTS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+    def LTS(self, op):
+        val1, val2 = self.LTSGTS()
+        self.dataStack.values.append(val1 < val2)
 
-        if type1 == type2:
-            val = val1 > val2
-            val = str(val).lower()
-            self.dataStack.push('bool', val)
-        else:
-            sys.exit(53)
+    def GTS(self, op):
+        val1, val2 = self.LTSGTS()
+        self.dataStack.values.append(val1 > val2)
 
-    def EQS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
-
-        if type1 == type2:
-            try:
-                val = val1 == val2
-            except ValueError:
-                sys.exit(53)
-            val = str(val).lower()
-            self.dataStack.push('bool', val)
-        elif type1 == 'nil' or type2 == 'nil':
-            self.dataStack.push('bool', 'false')
-        else:
-            sys.exit(53)
+    def EQS(self, op):
+        self.dataStack.values.append(self.EQSJUMP())
 
     def ANDSORS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+        val1, val2 = self.dataStack.popTwo()
 
-        if type1 != 'bool' or type2 != 'bool':
-            sys.exit(53)
-
-        if val1 == 'true':
-            val1 = True
-        elif val1 == 'false':
-            val1 = False
-        if val2 == 'true':
-            val2 = True
-        elif val2 == 'false':
-            val2 = False
+        if type(val1) is not bool or type(val2) is not bool:
+            raise OperandTypeError()
 
         return val1, val2
 
-    def ANDS(self):
+    def ANDS(self, op):
         val1, val2 = self.ANDSORS()
-        val = val1 and val2
-        val = str(val).lower()
-        self.dataStack.push('bool', val)
+        self.dataStack.values.append(val1 and val2)
 
-    def ORS(self):
+    def ORS(self, op):
         val1, val2 = self.ANDSORS()
-        val = val1 or val2
-        val = str(val).lower()
-        self.dataStack.push('bool', val)
-
-    def NOTS(self):
-        type, val = self.dataStack.pop()
-        if type != 'bool':
-            sys.exit(53)
-
-        if val == 'true':
-            val = True
-        elif val == 'false':
-            val = False
-
-        val = str(not val).lower()
-        self.dataStack.push('bool', val)
-
-    def INT2CHARS(self):
-        type, val = self.dataStack.pop()
-        if type != 'int':
-            sys.exit(53)
+        self.dataStack.values.append(val1 or val2)
+
+    def NOTS(self, op):
+        val = self.dataStack.pop()
+        if type(val) is not bool:
+            raise OperandTypeError()
+
+        self.dataStack.values.append(not val)
+
+    def INT2CHARS(self, op):
+        val = self.dataStack.pop()
+        if type(val) is not int:
+            raise OperandTypeError()
         try:
-            val = chr(int(val))
-        except ValueError:
-            sys.exit(58)
-        self.dataStack.push('string', val)
+            val = chr(val)
+        except (ValueError, OverflowError):
+            raise StringError()
+        self.dataStack.values.append(val)
 
-    def STRI2INTS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+    def STRI2INTS(self, op):
+        val1, val2 = self.dataStack.popTwo()
 
-        if type1 != 'string' or type2 != 'int':
-            sys.exit(53)
+        if type(val1) is not str or type(val2) is not int:
+            raise OperandTypeError()
+        if val2 < 0:
+            raise StringError()
 
         try:
-            val = ord(val1[int(val2)])
-        except ValueError:
-            sys.exit(58)
+            val = ord(val1[val2])
         except IndexError:
-            sys.exit(58)
+            raise StringError()
 
-        self.dataStack.push('int', val)
+        self.dataStack.values.append(val)
 
-    def JUMPIFEQS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+    def EQSJUMP(self):
+        val1, val2 = self.dataStack.popTwo()
 
-        if type1 == type2:
-            if val1 == val2:
-                try:
-                    self.counter = self.labels[self.ins.arg1.value]
-                except KeyError:
-                    sys.exit(52)
-        elif type1 == 'nil' or type2 == 'nil':
-            return
+        if type(val1) is type(val2):
+            return val1 == val2
+        elif val1 is NIL or val2 is NIL:
+            return False
         else:
-            sys.exit(53)
+            raise OperandTypeError()
 
-    def JUMPIFNEQS(self):
-        type2, val2 = self.dataStack.pop()
-        type1, val1 = self.dataStack.pop()
+    def JUMPIFEQS(self, op):
+        if self.EQSJUMP():
+            self.JUMP(op)
 
-        if type1 == type2:
-            if val1 != val2:
-                try:
-                    self.counter = self.labels[self.ins.arg1.value]
-                except KeyError:
-                    sys.exit(52)
-        elif type1 == 'nil' or type2 == 'nil':
+    def JUMPIFNEQS(self, op):
+        if not self.EQSJUMP():
+            self.JUMP(op)
+
+    """SUPERINSTRUCTIONS, EACH RUNS SEVERAL INSTRUCTIONS FUSED BY fuse()"""
+    def CREATEFRAME_PUSHFRAME_CALL(self, op):
+        if self.TF is not None:
+            self.framePool.release(self.TF)
+        frame = self.framePool.acquire()
+        self.frameStack.push(frame)
+        self.LF = frame
+        self.TF = None
+        self.tfVersion += 1
+        self.callStack.push(self.counter + 2)
+        self.counter = op.target
+        self.executed += 2
+
+    def PUSHS_PUSHS_STACK(self, op):
+        first, second, stack = op.parts
+        val1 = self.peekSymb(first.arg1)
+        val2 = self.peekSymb(second.arg1)
+        types, func = QUICKBINARY[stack.name[:-1]]
+        if type(val1) is type(val2) and type(val1) in types:
             try:
-                self.counter = self.labels[self.ins.arg1.value]
-            except KeyError:
-                sys.exit(52)
+                self.dataStack.values.append(func(val1, val2))
+                self.counter += 2
+                self.executed += 2
+                return
+            except ZeroDivisionError:
+                pass
+        self.runParts(op)
+
+    def INLINE(self, op):
+        parts = op.parts
+        for part in parts[1:]:
+            part.handler(part)
+        # return is counted too, so count does not depend on inlining
+        self.executed += len(parts)
+
+    def TEST_JUMP(self, op):
+        test = op.parts[0]
+        test.handler(test)
+        _, frame, slot = op.arg1
+        if self.__dict__[frame].values[slot] is op.arg2[2]:
+            self.counter = op.target
         else:
-            sys.exit(53)
+            self.counter += 1
+        self.executed += 1
 
     def getAllLabels(self, instructions):
         """
@@ -900,36 +1540,213 @@ class InstructionHandler:
                 if i.arg1.value not in self.labels:
                     self.labels[i.arg1.value] = i.order
                 else:
-                    sys.exit(52)
+                    raise SemanticError()
 
-    def start(self, instructions, inputfile):
+    def image(self, instructions):
         """
-        Final checks and start of interpreting
-        :param instructions: List of all instruction objects
-        :param inputfile: Input file for READ instruction
-        :return:
+        Checks instructions and turns them into image of compiled program, which restore() turns into program
+        Argument counts are checked here once instead of on every executed instruction
+        Labels are resolved to targets and variables to slots, so image holds only plain values and can be
+        stored and loaded again without XML, nil constants are kept as None
+        :param instructions: List of all instruction objects, including dummy ones
+        :return: Tuple (labels, GF layout, local frame layout, tuple of (name, arg1, arg2, arg3, target))
         """
         self.getAllLabels(instructions)
-        if inputfile != 'stdin':
-            self.input = open(inputfile, 'r')
-        else:
-            self.input = sys.stdin
-        # main loop
-        while True:
-            ins = instructions[self.counter]
-            # for convenience so index in list corresponds with instruction order
-            if ins.name == "DUMMY_START":
-                self.counter += 1
-                continue
-                # if dummy instruction is last, stop interpreting
-            if ins.name == "DUMMY_END":
-                break
-
+        entries = []
+        for ins in instructions[1:-1]:  # skip dummy instructions
             checkArgCount(ins)
+            args = []
+            for arg in (ins.arg1, ins.arg2, ins.arg3):
+                arg = self.resolve(decodeArg(arg))
+                if arg is not None and arg[0] == 'nil':
+                    arg = ('nil', None, None)
+                args.append(arg)
+            target = None
+            if args[0] is not None and args[0][0] == 'label':
+                # unknown label stays None and is reported when jump is executed
+                target = self.labels.get(args[0][2])
+            entries.append((ins.name, *args, target))
+        return self.labels, self.gfSlots, self.localSlots, tuple(entries)
+
+    def restore(self, image):
+        """
+        Turns image of compiled program into program, so main loop only indexes and calls
+        GF is allocated for all variables
+        :param image: Tuple from image()
+        :return: Nothing
+        """
+        labels, gfSlots, localSlots, entries = image
+        self.labels = dict(labels)
+        self.gfSlots = dict(gfSlots)
+        self.localSlots = dict(localSlots)
+        # index 0 is kept for dummy start, so index in program corresponds with instruction order
+        self.program = [Op('DUMMY_START', self.LABEL)]
+        for name, arg1, arg2, arg3, target in entries:
+            op = Op(name, getattr(self, name), nilArg(arg1), nilArg(arg2), nilArg(arg3), target)
+            if name in QUICKENED:
+                # rewritten into specialized variant after first execution
+                op.handler = self.quicken
+            self.preEncode(op)
+            self.program.append(op)
+        self.GF = Frame(len(self.gfSlots))
+        self.framePool = FramePool(len(self.localSlots))
+
+    def preEncode(self, op):
+        """
+        Replaces handler of WRITE with constant operand, its output is encoded only once at load time
+        :param op: Compiled instruction
+        :return: Nothing
+        """
+        if op.name != 'WRITE' or op.arg1 is None or op.arg1[0] not in ['int', 'string', 'bool', 'nil']:
+            return
+        data = self.output.encode(toString(op.arg1[2]))
+        writeBytes = self.output.writeBytes
+
+        def WRITE_CONST(op):
+            writeBytes(data)
+        op.handler = op.generic = WRITE_CONST
+
+    def run(self):
+        """
+        Main interpreting loop over compiled program
+        :return: Nothing
+        """
+        program = self.program
+        end = len(program)
+        self.counter = 1  # skip dummy start
+        while self.counter < end:
+            op = program[self.counter]
             self.counter += 1
-            self.checkInstruction(ins)
+            op.handler(op)
             self.executed += 1
-            # self.printMemory()
+            # self.printMemory(op)
+
+    def step(self, n):
+        """
+        Executes at most n instructions of program prepared by load(), next call continues where this one stopped
+        Slice also ends before READ which has to wait for input, so caller can wait for it without blocking
+        :param n: Number of instructions in time slice
+        :return: True if program can continue, False if it ended
+        """
+        program = self.program
+        end = len(program)
+        limit = self.executed + n
+        try:
+            while self.counter < end and self.executed < limit:
+                op = program[self.counter]
+                self.counter += 1
+                op.handler(op)
+                self.executed += 1
+        except InputPending:
+            # READ did not change anything yet, it is executed again in next slice
+            self.counter -= 1
+        return self.counter < end
+
+    def openInput(self, inputfile):
+        """
+        Opens input for READ instruction
+        :param inputfile: Input file path, 'stdin' or text stream
+        :return: Nothing
+        """
+        if inputfile == 'stdin':
+            self.input = sys.stdin
+        elif isinstance(inputfile, str):
+            self.input = open(inputfile, 'r')
+        else:
+            self.input = inputfile
 
+    def load(self, instructions, inputfile, engine='reference', memo=0, image=None):
+        """
+        Compiles program and opens its input, program can be then executed by step()
+        :param instructions: List of all instruction objects, not used when image is given
+        :param inputfile: Input file for READ instruction
+        :param engine: Engine program is prepared for, load-time optimizations of reference engine are applied
+        :param memo: Size of cache of pure subroutine results, 0 disables it, used only by reference engine
+        :param image: Image of compiled program from image(), loaded from .ippc cache for example
+        :return: Nothing
+        """
+        if image is None:
+            image = self.image(instructions)
+        self.restore(image)
+        if engine == 'reference':
+            self.optimizeCalls()
+            self.fuse()
+            self.lazyStrings = True
+            if memo > 0:
+                from memo import Memoizer
+                self.memo = Memoizer(self, memo)
+                self.memo.install()
+        self.openInput(inputfile)
+        self.counter = 1  # skip dummy start
+
+    def start(self, instructions, inputfile, engine='reference', cachefile=None, digest='', report=False, memo=0,
+              image=None):
+        """
+        Final checks and start of interpreting
+        :param instructions: List of all instruction objects, not used when image is given
+        :param inputfile: Input file for READ instruction
+        :param engine: 'reference' runs handler methods directly, 'threaded' runs closure compiled code,
+                       'transpiled' runs basic blocks compiled into Python source,
+                       'tracing' compiles only hot loops
+        :param cachefile: Path where transpiled module is cached, None to keep it in memory only
+        :param digest: Hash of XML source, stored in cached module
+        :param report: Print applied load-time optimizations and frame pool statistics to stderr
+        :param memo: Size of cache of pure subroutine results, 0 disables it
+        :param image: Image of compiled program from image()
+        :return:
+        """
+        self.load(instructions, inputfile, engine, memo, image)
+        if report:
+            for line in self.optimizations:
+                print(line, file=sys.stderr)
+        try:
+            if engine == 'threaded':
+                from threaded_code import ThreadedCode
+                code = ThreadedCode(self)
+                code.compile()
+                code.run()
+            elif engine == 'tracing':
+                from tracing import TracingJIT
+                TracingJIT(self).run()
+            elif engine == 'transpiled':
+                import transpiler
+                source = transpiler.Transpiler(self.program, self.labels, self.gfSlots, self.localSlots).source(digest)
+                transpiler.TranspiledCode(self, transpiler.load(source, cachefile)).run()
+            else:
+                self.run()
+        finally:
+            # also reached through exception of EXIT or error
+            self.output.flush()
+            if report:
+                self.printPoolStats()
+
+    def startTranspiled(self, module, inputfile, report=False):
+        """
+        Start of interpreting program loaded from cached transpiled module, XML is not parsed at all
+        :param module: Module generated by transpiler
+        :param inputfile: Input file for READ instruction
+        :param report: Print frame pool statistics to stderr
+        :return:
+        """
+        from transpiler import TranspiledCode
+        code = TranspiledCode(self, module)
+        code.rebuildProgram()
+        self.openInput(inputfile)
+        try:
+            code.run()
+        finally:
+            self.output.flush()
+            if report:
+                self.printPoolStats()
+
+    def printPoolStats(self):
+        """
+        Prints hit rate of frame pool to stderr
+        :return: Nothing
+        """
+        pool = self.framePool
+        print(f'frame pool: {pool.hits} hits, {pool.misses} misses, hit rate {pool.hitRate():.1%}', file=sys.stderr)
+        if self.memo is not None:
+            print(f'memo: {len(self.memo.summaries)} pure subroutines, {self.memo.hits} hits, {self.memo.misses} misses',
+                  file=sys.stderr)
 
-ih = InstructionHandler()
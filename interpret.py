@@ -1,13 +1,22 @@
 import argparse
+import io
 import sys
 import os.path
 import xml.etree.ElementTree as ET
 import re
 from globals import *
-from collections import Counter
+from collections import namedtuple
 
+from errors import *
 from instruction import Instruction
-from instruction_handler import ih
+from instruction_handler import InstructionHandler
+from cache import sourceDigest, cachePath, imagePath, readImage, writeImage
+from scanner import scanProgram
+from lexer import isText, lexProgram
+from transpiler import loadCached
+
+# result of run(), output is None when program wrote into given stream
+Result = namedtuple('Result', ['code', 'executed', 'output'])
 
 
 class DummyInstruction:
@@ -32,43 +41,184 @@ def checkFile(file):
         return False
 
 
-# helper function to sort and check if order is valid
-def checkAndSortOrder(instructions):
-    # try sorting instructions by order attribute
-    try:
-        instructions.sort(key=lambda x: int(x.order))
-    except ValueError:
-        sys.exit(32)
-
-    orderList = []
-    for ins in instructions:
-        if int(ins.order) >= 1:
-            orderList.append(int(ins.order))
+def iterElements(source):
+    """
+    Parses XML source as stream, the tree is cleared behind every child of root, so the whole tree is never in memory
+    :param source: Path to XML file or file object
+    :return: Generator of root element followed by every child of root when it is closed
+    """
+    root = None
+    depth = 0
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+                yield root
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield element
+            root.clear()
+
+
+def readSource(source):
+    """
+    Reads whole source
+    :param source: Path to XML file or file object
+    :return: Bytes, or str when source is text stream
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return f.read()
+    return source.read()
+
+
+def loadProgram(source, scan=False):
+    """
+    Parses XML or IPPcode22 text source into list of instruction objects, dummy instructions are added to both ends
+    Instruction objects are made as soon as their elements are closed and the elements are dropped,
+    so only the instruction objects stay in memory, never the whole tree
+    Errors of structure are kept until the end of source, so not well-formed XML is reported first as before
+    :param source: Path to source file or binary file object
+    :param scan: Try fast scanner of plain generated XML first, ElementTree parses anything it does not accept
+    :return: List of instructions
+    """
+    elements = None
+    if isText(source):
+        # text is turned into the same elements as XML, so XML is skipped entirely
+        elements = lexProgram(readSource(source))
+    elif scan:
+        data = readSource(source)
+        if isinstance(data, str):
+            source = io.StringIO(data)
         else:
-            sys.exit(32)
+            elements = scanProgram(data)
+            source = io.BytesIO(data)
+    if elements is None:
+        elements = iterElements(source)
 
-    #  check if order numbers are unique
-    counter = Counter(orderList)
-    for values in counter.values():
-        if values > 1:
-            sys.exit(32)
+    INSTRUCTIONS = []  # list of all instructions
+    orders = set()  # order numbers seen so far
+    error = None  # first error of structure
+    root = None
+    try:
+        for element in elements:
+            if root is None:
+                root = element
+                # check for 'IPPcode22' attribute
+                if root.tag != "program":
+                    error = XMLStructureError()
+                elif "language" not in root.attrib:
+                    error = XMLFormatError()
+                elif re.match('^ippcode22$', root.attrib["language"], re.IGNORECASE) is None:
+                    error = XMLStructureError()
+                continue
+            if error is not None:
+                continue
+            try:
+                # make new object for instruction and insert it into instruction list
+                ins = Instruction(element)
+                order = int(ins.order)
+                # order numbers have to be positive and unique
+                if order < 1 or order in orders:
+                    raise XMLStructureError()
+            except ValueError:
+                error = XMLStructureError()
+            except IPPError as e:
+                error = e
+            else:
+                orders.add(order)
+                INSTRUCTIONS.append(ins)
+    except ET.ParseError:
+        raise XMLFormatError()
+    if error is not None:
+        raise error
+
+    # sort instructions by order attribute and reorder them from 1 by step 1
+    INSTRUCTIONS.sort(key=lambda x: int(x.order))
+    for i in range(len(INSTRUCTIONS)):
+        INSTRUCTIONS[i].order = i + 1
+
+    dummy_start = DummyInstruction()
+    dummy_start.name = "DUMMY_START"
+    dummy_start.order = 0
 
-        #  reorder instructions from 1 by step 1
-    for i in range(len(instructions)):
-        instructions[i].order = i + 1
+    dummy_end = DummyInstruction()
+    dummy_end.name = "DUMMY_END"
+    dummy_end.order = len(INSTRUCTIONS) + 1
 
-    return instructions
+    # insert dummy instructions in the beginning and of instruction list
+    return [dummy_start] + INSTRUCTIONS + [dummy_end]
+
+
+def loadImage(handler, source, cachedir=None, scan=False):
+    """
+    Compiles XML source through .ippc cache of compiled programs, on warm cache XML is not parsed at all
+    Cache is keyed by hash of XML bytes and front end, so changed source is compiled again and its .ippc is replaced,
+    and program compiled from scanner is never used by run which parses XML by ElementTree
+    :param handler: InstructionHandler which compiles program
+    :param source: Path to source file or binary file object
+    :param cachedir: Directory of .ippc files, None to keep .ippc next to source file
+    :param scan: Parse source by fast scanner when it can
+    :return: Image of compiled program, see InstructionHandler.image()
+    """
+    data = readSource(source)
+    digest = sourceDigest(data) + ('-scan' if scan else '')
+    path = imagePath(source if isinstance(source, str) else None, cachedir, digest)
+    image = None if path is None else readImage(path, digest)
+    if image is None:
+        image = handler.image(loadProgram(io.BytesIO(data), scan))
+        if path is not None:
+            writeImage(path, digest, image)
+    return image
+
+
+def run(program, input=None, output=None, engine='reference', memo=0, scan=False, ippc=False, cachedir=None):
+    """
+    Interprets program in its own virtual machine, nothing is written to stdout and process never exits,
+    so one process can run any number of programs
+    :param program: Path to XML or IPPcode22 text source, its content as bytes or binary file object
+    :param input: Input for READ as string or text stream, None for empty input
+    :param output: Binary stream for output of program, None to capture it into result
+    :param engine: Execution engine, same as --engine option
+    :param memo: Size of cache of pure subroutine results, same as --memo option
+    :param scan: Parse source by fast scanner when it can, same as --scan option
+    :param ippc: Cache compiled program in .ippc file, same as --ippc option
+    :param cachedir: Directory of .ippc files, same as --cache-dir option
+    :return: Result with return code, number of executed instructions and captured output
+    """
+    if isinstance(program, bytes):
+        program = io.BytesIO(program)
+    if input is None or isinstance(input, str):
+        input = io.StringIO(input or '')
+    captured = io.BytesIO() if output is None else None
+    handler = InstructionHandler(output if captured is None else captured)
+    code = 0
+    try:
+        if ippc:
+            handler.start(None, input, engine, memo=memo, image=loadImage(handler, program, cachedir, scan))
+        else:
+            handler.start(loadProgram(program, scan), input, engine, memo=memo)
+    except (IPPError, ProgramExit) as e:
+        code = e.code
+    return Result(code, handler.executed, None if captured is None else captured.getvalue().decode('utf-8'))
 
 
 def main():
-    # global variables
-    INSTRUCTIONS = []  # list of all instructions
     global source  # XML source
     global inputFile   # input file
 
     parse = argparse.ArgumentParser(add_help=False)
-    parse.add_argument('--source', help='XML source')
+    parse.add_argument('--source', help='XML or IPPcode22 text source')
     parse.add_argument('--input', help='input data')
+    parse.add_argument('--engine', choices=['reference', 'threaded', 'transpiled', 'tracing'], default='reference',
+                       help='execution engine')
+    parse.add_argument('--cache-dir', help='directory for transpiled and .ippc compiled programs')
+    parse.add_argument('--report', action='store_true', help='print applied optimizations')
+    parse.add_argument('--memo', type=int, default=0, help='memoize pure subroutines')
+    parse.add_argument('--scan', action='store_true', help='parse plain generated XML by fast scanner')
+    parse.add_argument('--ippc', action='store_true', help='cache compiled program in .ippc file')
     parse.add_argument('--help', required=False, action='store_true')
     args = parse.parse_args()
 
@@ -77,13 +227,23 @@ def main():
         sys.exit(10)
     # help only
     elif args.help:
-        print(f"usage: interpret.py [-h] [--source SOURCE] [--input INPUT]"
+        print(f"usage: interpret.py [-h] [--source SOURCE] [--input INPUT] [--engine ENGINE]"
+              f" [--cache-dir DIR] [--report] [--memo SIZE] [--scan] [--ippc]"
               f"\n"
               f"\n"
               f"optional arguments:\n"
               f"--help           show this help message and exit\n"
-              f"--source SOURCE  XML source\n"
-              f"--input INPUT    input data\n")
+              f"--source SOURCE  XML or IPPcode22 text source\n"
+              f"--input INPUT    input data\n"
+              f"--engine ENGINE  execution engine, 'reference' (default), 'threaded',\n"
+              f"                 'transpiled' or 'tracing'\n"
+              f"--cache-dir DIR  directory for transpiled programs, used with 'transpiled' engine,\n"
+              f"                 and for .ippc compiled programs\n"
+              f"--report         print applied optimizations to stderr\n"
+              f"--memo SIZE      cache up to SIZE results of pure subroutines, used with 'reference' engine\n"
+              f"--scan           parse plain generated XML by fast scanner, other XML is parsed as usual\n"
+              f"--ippc           cache compiled program in .ippc file next to source or in --cache-dir,\n"
+              f"                 XML is not parsed again until it changes\n")
         sys.exit(0)
 
     # determining where to read from for source and input
@@ -111,51 +271,39 @@ def main():
     elif args.source is None and args.input is None:
         sys.exit(10)  # bad parameters
 
-    # try to parse XML file
-    # source file not specified -> source = stdin
-    if source == "stdin":
-        try:
-            xmltree = ET.parse(sys.stdin)
-        except ET.ParseError:
-            sys.exit(31)
-    # source file specified -> source = filepath
-    else:
-        try:
-            xmltree = ET.parse(source)
-        except ET.ParseError:
-            sys.exit(31)
-
-    root = xmltree.getroot()
-    # print(root.attrib["language"])
-    if root.tag != "program":
-        sys.exit(32)
-
-    # check for 'IPPcode22' attribute
+    handler = InstructionHandler()
     try:
-        if re.match('^ippcode22$', root.attrib["language"], re.IGNORECASE) is None:
-            sys.exit(32)
-    except KeyError:
-        sys.exit(31)
+        # transpiled program is cached by hash of XML source, on hit XML is not parsed at all
+        cacheFile = None
+        digest = ''
+        data = None
+        if args.engine == 'transpiled' and args.cache_dir is not None:
+            if source == "stdin":
+                data = sys.stdin.buffer.read()
+            digest = sourceDigest(data, source)
+            cacheFile = cachePath(args.cache_dir, digest, '.py')
+            module = loadCached(cacheFile)
+            if module is not None:
+                handler.startTranspiled(module, inputFile, args.report)
+                return
 
-    for instruction in xmltree.findall("./"):
-        # make new object for instruction and insert it into instruction list
-        ins = Instruction(instruction)
-        INSTRUCTIONS.append(ins)
-
-    INSTRUCTIONS = checkAndSortOrder(INSTRUCTIONS)
-
-    dummy_start = DummyInstruction()
-    dummy_start.name = "DUMMY_START"
-    dummy_start.order = 0
-
-    dummy_end = DummyInstruction()
-    dummy_end.name = "DUMMY_END"
-    dummy_end.order = len(INSTRUCTIONS) + 1
-
-    # insert dummy instructions in the beginning and of instruction list
-    INSTRUCTIONS = [dummy_start] + INSTRUCTIONS + [dummy_end]
+        instructions = None
+        image = None
+        if args.ippc:
+            # stdin can be read only once, it is already in data when transpiled cache was looked up
+            if source == "stdin" and data is None:
+                data = sys.stdin.buffer.read()
+            image = loadImage(handler, source if data is None else io.BytesIO(data), args.cache_dir, args.scan)
+        # source file not specified -> source = stdin
+        elif source == "stdin":
+            instructions = loadProgram(sys.stdin.buffer if data is None else io.BytesIO(data), args.scan)
+        # source file specified -> source = filepath
+        else:
+            instructions = loadProgram(source, args.scan)
 
-    ih.start(INSTRUCTIONS, inputFile)
+        handler.start(instructions, inputFile, args.engine, cacheFile, digest, args.report, args.memo, image)
+    except (IPPError, ProgramExit) as e:
+        sys.exit(e.code)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,100 @@
+from errors import HeaderError, XMLFormatError, XMLStructureError
+from scanner import Element
+
+# instructions with label as first operand
+LABELOPS = ['LABEL', 'JUMP', 'CALL', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS']
+FRAMES = ['GF', 'LF', 'TF']
+CONSTANTS = ['int', 'bool', 'string', 'nil']
+# beginning of source read to tell text from XML
+HEADSIZE = 4096
+# byte order mark editors may write at start of UTF-8 file
+BOM = b'\xef\xbb\xbf'
+
+
+def isText(source):
+    """
+    Checks if source is IPPcode22 text instead of XML
+    XML always starts with <, anything else after empty lines and comments is text, so text with missing
+    or wrong header gets error of header instead of error of XML
+    Byte order mark is skipped, so it does not hide the first character
+    :param source: Path to file or binary file object, position in file object is not changed
+    :return: True for text source
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            head = f.read(HEADSIZE)
+    elif hasattr(source, 'peek'):
+        head = source.peek(HEADSIZE)
+    elif source.seekable():
+        position = source.tell()
+        head = source.read(HEADSIZE)
+        source.seek(position)
+    else:
+        return False
+    if isinstance(head, str):
+        head = head.encode('utf-8')
+    if head.startswith(BOM):
+        head = head[len(BOM):]
+    for line in head.split(b'\n'):
+        line = line.split(b'#', 1)[0].strip()
+        if line:
+            return not line.startswith(b'<')
+    return False
+
+
+def operand(opcode, i, token):
+    """
+    Turns operand into argument element, kind of label and type operands is given by instruction,
+    kind of the other ones by prefix before @
+    :param opcode: Instruction name in upper case
+    :param i: Operand number
+    :param token: Operand as written in source
+    :return: Element with the same type and text XML source would have
+    """
+    tag = 'arg' + str(i)
+    if i == 1 and opcode in LABELOPS:
+        return Element(tag, {'type': 'label'}, token)
+    if i == 2 and opcode == 'READ':
+        return Element(tag, {'type': 'type'}, token)
+    prefix, at, value = token.partition('@')
+    if prefix in FRAMES and at:
+        return Element(tag, {'type': 'var'}, token)
+    if prefix in CONSTANTS and at:
+        # escape sequences stay in string, Argument replaces them the same way as in text of XML
+        return Element(tag, {'type': prefix}, value)
+    raise XMLStructureError()
+
+
+def lexProgram(data):
+    """
+    Line oriented lexer of IPPcode22 text source, header line is followed by one instruction per line,
+    everything after # is comment, byte order mark before header is skipped
+    Instructions come out as elements XML source of the same program would have, so they are checked by Instruction
+    and Argument and wrong program gets the same error code as its XML
+    :param data: Source as bytes or str
+    :return: Generator of root element followed by instruction elements
+    """
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise XMLFormatError()
+    elif data.startswith('\ufeff'):
+        data = data[1:]
+    header = False
+    order = 0
+    for line in data.split('\n'):
+        tokens = line.split('#', 1)[0].split()
+        if not tokens:
+            continue
+        if not header:
+            # missing or wrong header is reported with the code of parser of IPPcode22
+            if len(tokens) != 1 or tokens[0].lower() != '.ippcode22':
+                raise HeaderError()
+            header = True
+            yield Element('program', {'language': 'IPPcode22'})
+            continue
+        order += 1
+        opcode = tokens[0].upper()
+        yield Element('instruction', {'order': str(order), 'opcode': tokens[0]}, None,
+                      [operand(opcode, i, token) for i, token in enumerate(tokens[1:], 1)])
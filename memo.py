@@ -0,0 +1,242 @@
+from collections import OrderedDict
+
+from instruction_handler import CharBuffer
+
+# instructions with effect outside of called subroutine
+IMPURE = ['READ', 'WRITE', 'DPRINT', 'BREAK', 'EXIT', 'CLEARS']
+# (values popped, values pushed) of stack instructions
+STACKEFFECT = {'PUSHS': (0, 1), 'POPS': (1, 0),
+               'ADDS': (2, 1), 'SUBS': (2, 1), 'MULS': (2, 1), 'IDIVS': (2, 1),
+               'LTS': (2, 1), 'GTS': (2, 1), 'EQS': (2, 1), 'ANDS': (2, 1), 'ORS': (2, 1),
+               'NOTS': (1, 1), 'INT2CHARS': (1, 1), 'STRI2INTS': (2, 1),
+               'JUMPIFEQS': (2, 0), 'JUMPIFNEQS': (2, 0)}
+BRANCHES = ['JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS']
+# marker of effect which leaves TF of caller untouched
+KEEP = object()
+
+
+def freeze(values):
+    """
+    Copies values stored in memo, CharBuffer is mutable, so it is stored as flat string
+    :param values: Sequence of values
+    :return: Tuple
+    """
+    return tuple(str(v) if type(v) is CharBuffer else v for v in values)
+
+
+class Memoizer:
+    """
+    Class caching results of pure subroutines reached by CALL
+    Subroutine is pure, when nothing it can reach touches GF, input, output or frames and data stack below the ones
+    it got. Its effect then depends only on values of LF and top of data stack it is called with, so the effect
+    recorded on first call (new LF values, pushed values and TF) is replayed on next calls with the same values.
+    Least recently used entries are evicted when cache is full.
+    """
+    def __init__(self, handler, size):
+        self.handler = handler
+        self.size = size
+        self.cache = OrderedDict()
+        # entry index of pure subroutine: (values popped from stack, stack height change, whether LF is used)
+        self.summaries = {}
+        self.pending = []  # calls being recorded
+        self.hits = 0
+        self.misses = 0
+
+    def analyze(self, program, target, summaries, optimistic):
+        """
+        Checks subroutine by walking all instructions reachable from its entry
+        State of every instruction is stack height, depth of frames pushed by subroutine and whether TF was
+        created by subroutine (TF of caller must not be used), all paths must agree on it
+        :param program: Compiled program without superinstructions
+        :param target: Index of subroutine entry
+        :param summaries: Known pure subroutines
+        :param optimistic: Path through call of unknown subroutine is skipped instead of failing,
+                           so recursive subroutines get first summary from their base case
+        :return: Summary (values popped, stack height change, whether LF of caller is used)
+                 or None if subroutine is not pure
+        """
+        states = {}
+        work = [(target, 0, 0, False)]
+        lowest = 0
+        change = None
+        usesLF = False
+        while work:
+            i, height, depth, ownTF = work.pop()
+            if i is None or i >= len(program):
+                return None
+            seen = states.get(i)
+            if seen is not None:
+                if seen[:2] != (height, depth):
+                    return None
+                if not seen[2] or ownTF:
+                    continue
+                # path with TF of caller joins, it is not known to be own any more
+                ownTF = False
+            states[i] = (height, depth, ownTF)
+
+            op = program[i]
+            if op.name in IMPURE:
+                return None
+            for arg in (op.arg1, op.arg2, op.arg3):
+                if arg is not None and arg[0] == 'var':
+                    if arg[1] == 'GF' or arg[1] == 'TF' and not ownTF:
+                        return None
+                    if arg[1] == 'LF' and depth == 0:
+                        usesLF = True
+
+            if op.name == 'RETURN':
+                if depth != 0 or change not in (None, height):
+                    return None
+                change = height
+                continue
+            if op.name == 'CREATEFRAME':
+                ownTF = True
+            elif op.name == 'PUSHFRAME':
+                if not ownTF:
+                    return None
+                depth += 1
+            elif op.name == 'POPFRAME':
+                if depth == 0:
+                    return None
+                depth -= 1
+                ownTF = True
+            elif op.name == 'CALL':
+                summary = summaries.get(op.target)
+                if summary is None:
+                    if optimistic:
+                        continue
+                    return None
+                lowest = min(lowest, height - summary[0])
+                height += summary[1]
+                usesLF = usesLF or depth == 0 and summary[2]
+            elif op.name in STACKEFFECT:
+                popped, pushed = STACKEFFECT[op.name]
+                lowest = min(lowest, height - popped)
+                height += pushed - popped
+
+            if op.name == 'JUMP':
+                work.append((op.target, height, depth, ownTF))
+                continue
+            if op.name in BRANCHES:
+                work.append((op.target, height, depth, ownTF))
+            work.append((i + 1, height, depth, ownTF))
+
+        if change is None:
+            return None
+        return -lowest, change, usesLF
+
+    def findPure(self, program):
+        """
+        Finds pure subroutines among targets of CALL
+        Summaries are first guessed from paths which do not need unknown subroutines, then every subroutine is
+        checked with all guesses and the ones which do not match are dropped until nothing changes
+        :param program: Compiled program without superinstructions
+        :return: Nothing
+        """
+        targets = {op.target for op in program if op.name == 'CALL' and op.target is not None}
+        summaries = {}
+        changed = True
+        while changed:
+            changed = False
+            for target in targets - summaries.keys():
+                summary = self.analyze(program, target, summaries, True)
+                if summary is not None:
+                    summaries[target] = summary
+                    changed = True
+        changed = True
+        while changed:
+            changed = False
+            for target in list(summaries):
+                summary = self.analyze(program, target, summaries, False)
+                if summary == summaries[target]:
+                    continue
+                if summary is not None and summary[:2] == summaries[target][:2]:
+                    # LF is used on path which was not known to first guess
+                    summaries[target] = summary
+                else:
+                    del summaries[target]
+                changed = True
+        self.summaries = summaries
+
+    def install(self):
+        """
+        Replaces handlers of calls of pure subroutines and of all returns
+        Superinstruction ending with such call runs its parts, so the call goes through memo too
+        :return: Nothing
+        """
+        handler = self.handler
+        program = handler.program
+        self.findPure([op.parts[0] if op.parts else op for op in program])
+        if not self.summaries:
+            return
+        for op in program:
+            if op.name == 'INLINE':
+                # body of inlined leaf runs in place of call, it has nothing to memoize
+                continue
+            for part in op.parts or [op]:
+                if part.name == 'CALL' and part.target in self.summaries:
+                    part.handler = part.generic = self.CALL
+                    if op.parts:
+                        op.handler = handler.runParts
+                elif part.name == 'RETURN':
+                    part.handler = part.generic = self.RETURN
+        for target in sorted(self.summaries):
+            handler.optimizations.append(f'memoized subroutine at {target}')
+
+    def CALL(self, op):
+        vm = self.handler
+        stack = vm.dataStack.values
+        popped, _, usesLF = self.summaries[op.target]
+        if len(stack) < popped:
+            # reference handler reports error when stack runs out
+            vm.CALL(op)
+            return
+        args = tuple(stack[len(stack) - popped:])
+        lf = vm.LF if usesLF else None
+        values = args if lf is None else args + tuple(lf.values)
+        types = tuple(map(type, values))
+        if CharBuffer in types:
+            # mutable value can not be part of key
+            vm.CALL(op)
+            return
+        # types are part of key, because 1 == True
+        key = (op.target, lf is None, values, types)
+        effect = self.cache.get(key)
+        if effect is None:
+            self.misses += 1
+            self.pending.append((key, len(vm.callStack.values), len(stack) - popped, vm.tfVersion))
+            vm.CALL(op)
+            return
+
+        self.hits += 1
+        self.cache.move_to_end(key)
+        lfValues, pushed, tf = effect
+        if lf is not None:
+            lf.values[:] = lfValues
+        if popped:
+            del stack[-popped:]
+        stack.extend(pushed)
+        if tf is not KEEP:
+            if tf is None:
+                vm.TF = None
+            else:
+                vm.TF = vm.framePool.acquire()
+                vm.TF.values[:] = tf
+            vm.tfVersion += 1
+
+    def RETURN(self, op):
+        vm = self.handler
+        vm.counter = vm.callStack.pop()
+        pending = self.pending
+        if not pending or pending[-1][1] != len(vm.callStack.values):
+            return
+        key, _, base, entryVersion = pending.pop()
+        lf = vm.LF if self.summaries[key[0]][2] else None
+        tf = vm.TF
+        if vm.tfVersion == entryVersion:
+            tf = KEEP
+        elif tf is not None:
+            tf = freeze(tf.values)
+        self.cache[key] = (None if lf is None else freeze(lf.values), freeze(vm.dataStack.values[base:]), tf)
+        if len(self.cache) > self.size:
+            self.cache.popitem(last=False)
@@ -0,0 +1,67 @@
+import sys
+
+
+class Output:
+    """
+    Buffered sink for standard output of interpreted program
+    Text is encoded into large buffer, which is written to binary stream (sys.stdout.buffer by default)
+    when it is full, so WRITE does not go through print and text layer of stdout every time.
+    Buffer has to be flushed before anything is written to stderr, so both streams keep their order
+    """
+    def __init__(self, stream=None, limit=1 << 16):
+        self.buffer = bytearray()
+        self.limit = limit
+        if stream is None:
+            self.text = sys.stdout
+            self.stream = sys.stdout.buffer
+            self.encoding = getattr(sys.stdout, 'encoding', None) or 'utf-8'
+            self.errors = getattr(sys.stdout, 'errors', None) or 'strict'
+            # output to terminal is written immediately, so user sees it before program waits for input
+            if sys.stdout.isatty():
+                self.limit = 0
+        else:
+            self.text = None
+            self.stream = stream
+            self.encoding = 'utf-8'
+            self.errors = 'strict'
+
+    def encode(self, text):
+        """
+        Encodes text the same way output stream would
+        :param text: String
+        :return: Bytes
+        """
+        return text.encode(self.encoding, self.errors)
+
+    def write(self, text):
+        """
+        Appends text to buffer
+        :param text: String
+        :return: Nothing
+        """
+        self.buffer += text.encode(self.encoding, self.errors)
+        if len(self.buffer) > self.limit:
+            self.flush()
+
+    def writeBytes(self, data):
+        """
+        Appends already encoded text to buffer
+        :param data: Bytes returned by encode()
+        :return: Nothing
+        """
+        self.buffer += data
+        if len(self.buffer) > self.limit:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes buffer to output stream
+        :return: Nothing
+        """
+        if self.buffer:
+            if self.text is not None:
+                # text written by print() has to go first
+                self.text.flush()
+            self.stream.write(self.buffer)
+            self.stream.flush()
+            self.buffer.clear()
@@ -0,0 +1,177 @@
+import re
+
+# XML whitespace
+S = '[ \t\n\r]'
+NAME = '[A-Za-z_][A-Za-z0-9._-]*'
+ATTR = f'{S}+({NAME}){S}*={S}*(?:"([^"<]*)"|\'([^\'<]*)\')'
+ATTRS = f'(?:{S}+{NAME}{S}*={S}*(?:"[^"<]*"|\'[^\'<]*\'))*'
+
+DECLARATION = re.compile(f'<\\?xml{S}+version{S}*={S}*(["\'])1\\.0\\1'
+                         f'(?:{S}+encoding{S}*={S}*(["\'])([A-Za-z0-9._-]*)\\2)?'
+                         f'(?:{S}+standalone{S}*={S}*(["\'])(?:yes|no)\\4)?{S}*\\?>')
+ROOT = re.compile(f'{S}*<({NAME})({ATTRS}){S}*>')
+ROOT_END = re.compile(f'{S}*</({NAME}){S}*>{S}*')
+# instruction with all its arguments, arguments are scanned again by ARGUMENT
+INSTRUCTION = re.compile(f'{S}*<({NAME})({ATTRS}){S}*(?:/>|>((?:{S}*<{NAME}{ATTRS}{S}*(?:/>|>[^<]*</{NAME}{S}*>))*)'
+                         f'{S}*</({NAME}){S}*>)')
+# instruction exactly as generator writes it, <arg1>..<arg3> texts without references need no decoding
+PLAIN_ARGUMENT = f'(?:{S}*<arg([123]) type="([a-z]+)"(?:/>|>([^<&\r]*)</arg\\{{}}>))?'
+PLAIN = re.compile(f'{S}*<instruction order="([0-9]+)" opcode="([A-Za-z0-9]+)"{S}*(?:/>|>'
+                   + ''.join(PLAIN_ARGUMENT.format(group) for group in (3, 6, 9))
+                   + f'{S}*</instruction{S}*>)')
+ARGUMENT = re.compile(f'{S}*<({NAME})({ATTRS}){S}*(?:/>|>([^<]*)</({NAME}){S}*>)')
+ATTRIBUTE = re.compile(ATTR)
+# ampersand which does not start one of predefined entities or character reference
+BAD_AMPERSAND = re.compile('&(?!(?:lt|gt|amp|quot|apos|#[0-9]+|#x[0-9a-fA-F]+);)')
+ENTITY = re.compile('&(?:(lt|gt|amp|quot|apos)|#([0-9]+)|#x([0-9a-fA-F]+));')
+# characters which are not allowed in XML document, surrogates can come only from character references
+INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+ENTITIES = {'lt': '<', 'gt': '>', 'amp': '&', 'quot': '"', 'apos': "'"}
+
+
+class Unusual(Exception):
+    """
+    Document is not of the plain shape made by generator, ElementTree has to parse it
+    """
+
+
+class Element:
+    """
+    Class for element found by scanner, it has the part of ElementTree element interface used by Instruction
+    """
+    __slots__ = ('tag', 'attrib', 'text', 'children')
+
+    def __init__(self, tag, attrib, text=None, children=()):
+        self.tag = tag
+        self.attrib = attrib
+        self.text = text
+        self.children = children
+
+    def __iter__(self):
+        return iter(self.children)
+
+
+def character(match):
+    """
+    Replaces entity or character reference found by ENTITY
+    :param match: Match of reference
+    :return: Referenced character
+    """
+    name, decimal, hexadecimal = match.groups()
+    if name is not None:
+        return ENTITIES[name]
+    code = int(decimal) if decimal is not None else int(hexadecimal, 16)
+    if code > 0x10ffff:
+        raise Unusual()
+    char = chr(code)
+    if INVALID.match(char):
+        raise Unusual()
+    return char
+
+
+def decode(text, attribute=False):
+    """
+    Normalizes line ends and replaces references the same way XML parser does
+    :param text: Raw text of element or attribute value
+    :param attribute: Whitespace of attribute values is normalized to spaces
+    :return: Text as parser reports it
+    """
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if attribute and ('\n' in text or '\t' in text):
+        text = text.replace('\n', ' ').replace('\t', ' ')
+    if '&' in text:
+        if BAD_AMPERSAND.search(text):
+            raise Unusual()
+        text = ENTITY.sub(character, text)
+    return text
+
+
+def attributes(raw):
+    """
+    Parses attributes of start tag
+    :param raw: Part of start tag after its name
+    :return: Dictionary of attributes
+    """
+    attrib = {}
+    for name, double, single in ATTRIBUTE.findall(raw):
+        if name in attrib:
+            raise Unusual()  # not well-formed, parser reports it
+        # group of the other kind of quotes is ''
+        attrib[name] = decode(double or single, True)
+    return attrib
+
+
+def scan(text):
+    """
+    Scans document of plain shape <program><instruction><argN>text</argN></instruction></program>
+    Everything accepted is well-formed XML, which ElementTree parses to the same elements
+    :param text: Decoded document
+    :return: Root element followed by its child elements
+    """
+    if INVALID.search(text) or ']]>' in text:
+        raise Unusual()
+    pos = 0
+    declaration = DECLARATION.match(text)
+    if declaration is not None:
+        encoding = declaration.group(3)
+        # expat knows UTF-8 only by this name, other spellings are left to it
+        if encoding is not None and encoding.lower() != 'utf-8':
+            raise Unusual()
+        pos = declaration.end()
+
+    match = ROOT.match(text, pos)
+    if match is None:
+        raise Unusual()
+    elements = [Element(match.group(1), attributes(match.group(2)))]
+    pos = match.end()
+
+    while True:
+        match = PLAIN.match(text, pos)
+        if match is not None:
+            order, opcode, n1, type1, text1, n2, type2, text2, n3, type3, text3 = match.groups()
+            # empty element has no text in ElementTree
+            children = []
+            if n1 is not None:
+                children.append(Element('arg' + n1, {'type': type1}, text1 or None))
+            if n2 is not None:
+                children.append(Element('arg' + n2, {'type': type2}, text2 or None))
+            if n3 is not None:
+                children.append(Element('arg' + n3, {'type': type3}, text3 or None))
+            elements.append(Element('instruction', {'order': order, 'opcode': opcode}, None, children))
+            pos = match.end()
+            continue
+
+        match = INSTRUCTION.match(text, pos)
+        if match is None:
+            break
+        tag, attrs, args, end = match.groups()
+        if end is not None and end != tag:
+            raise Unusual()
+        children = []
+        for argument in ARGUMENT.finditer(args or ''):
+            name, argAttrs, value, argEnd = argument.groups()
+            if argEnd is not None and argEnd != name:
+                raise Unusual()
+            # empty element has no text in ElementTree
+            children.append(Element(name, attributes(argAttrs), decode(value) if value else None))
+        elements.append(Element(tag, attributes(attrs), None, children))
+        pos = match.end()
+
+    match = ROOT_END.fullmatch(text, pos)
+    if match is None or match.group(1) != elements[0].tag:
+        raise Unusual()
+    return elements
+
+
+def scanProgram(data):
+    """
+    Fast front end for XML source made by generator, element tree is not built at all
+    :param data: Source as bytes
+    :return: Root element followed by its child elements, None when document is unusual and ElementTree
+             has to parse it (it reports errors of XML too)
+    """
+    try:
+        return scan(data.decode('utf-8'))
+    except (UnicodeDecodeError, Unusual):
+        return None
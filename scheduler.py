@@ -0,0 +1,78 @@
+import asyncio
+import io
+from collections import deque
+
+from errors import IPPError, ProgramExit, InputPending
+from instruction_handler import InstructionHandler
+from interpret import Result, loadProgram
+
+
+class AsyncInput:
+    """
+    Input of READ instruction fed from asynchronous stream, READ never blocks event loop
+    When no line is buffered READ raises InputPending and runAsync() awaits next line before it is executed again
+    """
+    def __init__(self, reader):
+        """
+        :param reader: Object with coroutine readline() returning str or bytes, '' at end of input
+                       (asyncio.StreamReader for example)
+        """
+        self.reader = reader
+        self.lines = deque()
+        self.eof = False
+        self.waiting = False
+
+    def readline(self):
+        if self.lines:
+            return self.lines.popleft()
+        if self.eof:
+            return ''
+        self.waiting = True
+        raise InputPending()
+
+    async def fill(self):
+        """
+        Waits for next line of input
+        :return: Nothing
+        """
+        line = await self.reader.readline()
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if line == '':
+            self.eof = True
+        else:
+            self.lines.append(line)
+        self.waiting = False
+
+
+async def runAsync(program, input=None, output=None, slice=1000):
+    """
+    Interprets program the same way as interpret.run(), but as coroutine of asyncio event loop
+    Control is given back to event loop after every slice of instructions and while READ waits for input,
+    so any number of programs started by asyncio.gather() share one thread with fair time slices
+    Only reference engine can be interrupted this way
+    :param program: Path to XML or IPPcode22 text source, its content as bytes or binary file object
+    :param input: Input for READ as string, text stream or AsyncInput, None for empty input
+    :param output: Binary stream for output of program, None to capture it into result
+    :param slice: Number of instructions executed before other programs get their turn
+    :return: Result with return code, number of executed instructions and captured output
+    """
+    if isinstance(program, bytes):
+        program = io.BytesIO(program)
+    if input is None or isinstance(input, str):
+        input = io.StringIO(input or '')
+    captured = io.BytesIO() if output is None else None
+    handler = InstructionHandler(output if captured is None else captured)
+    code = 0
+    try:
+        handler.load(loadProgram(program), input)
+        while handler.step(slice):
+            if isinstance(input, AsyncInput) and input.waiting:
+                await input.fill()
+            else:
+                await asyncio.sleep(0)
+    except (IPPError, ProgramExit) as e:
+        code = e.code
+    finally:
+        handler.output.flush()
+    return Result(code, handler.executed, None if captured is None else captured.getvalue().decode('utf-8'))
@@ -0,0 +1,34 @@
+import os
+from concurrent import futures
+
+import pytest
+
+from batch import runBatch
+from interpret import run
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+def jobs():
+    """
+    Returns jobs of one program with different inputs and of program which fails
+    :return: List of (source bytes, input string) pairs
+    """
+    with open(os.path.join(TESTS, 'read.xml'), 'rb') as f:
+        read = f.read()
+    with open(os.path.join(TESTS, 'memo_tf.xml'), 'rb') as f:
+        tf = f.read()
+    return [(read, '1\nab\ntrue\n'), (tf, ''), (read, ''), (read, '7\n\nfalse\n')]
+
+
+@pytest.mark.parametrize('pool', [
+    'threads',
+    'processes',
+    pytest.param('interpreters', marks=pytest.mark.skipif(not hasattr(futures, 'InterpreterPoolExecutor'),
+                                                          reason='subinterpreters need Python 3.14+')),
+])
+def test_pool(pool, tmp_path):
+    expected = [run(source, data) for source, data in jobs()]
+    for cachedir in (None, str(tmp_path)):
+        results = runBatch(jobs(), 2, pool, cachedir=cachedir)
+        assert [(r.code, r.output) for r in results] == [(r.code, r.output) for r in expected]
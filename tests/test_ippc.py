@@ -0,0 +1,68 @@
+import os
+import shutil
+
+import cache
+import interpret
+from interpret import run
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+PROGRAM = '''<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode22">
+    <instruction order="1" opcode="WRITE">
+        <arg1 type="string">{}</arg1>
+    </instruction>
+</program>
+'''
+
+
+def notParsed(*args):
+    raise AssertionError('source parsed although .ippc is up to date')
+
+
+def test_warm(tmp_path, monkeypatch):
+    source = str(tmp_path / 'call_tail.xml')
+    shutil.copy(os.path.join(TESTS, 'call_tail.xml'), source)
+    cold = run(source, ippc=True)
+    assert os.path.exists(str(tmp_path / 'call_tail.ippc'))
+    monkeypatch.setattr(interpret, 'loadProgram', notParsed)
+    assert run(source, ippc=True) == cold
+
+
+def test_edit(tmp_path):
+    source = tmp_path / 'edit.xml'
+    source.write_text(PROGRAM.format('old'))
+    assert run(str(source), ippc=True).output == 'old'
+    source.write_text(PROGRAM.format('new'))
+    assert run(str(source), ippc=True).output == 'new'
+    assert run(str(source), ippc=True).output == 'new'
+
+
+def test_version(tmp_path, monkeypatch):
+    source = tmp_path / 'version.xml'
+    source.write_text(PROGRAM.format('v'))
+    run(str(source), ippc=True)
+    path = str(tmp_path / 'version.ippc')
+    digest = cache.sourceDigest(source.read_bytes())
+    assert cache.readImage(path, digest) is not None
+    monkeypatch.setattr(cache, 'IPPC_VERSION', cache.IPPC_VERSION + 1)
+    assert cache.readImage(path, digest) is None
+    assert run(str(source), ippc=True).output == 'v'
+    # program is compiled again and stored with new version
+    assert cache.readImage(path, digest) is not None
+
+
+def test_damaged(tmp_path):
+    source = tmp_path / 'damaged.xml'
+    source.write_text(PROGRAM.format('d'))
+    run(str(source), ippc=True)
+    (tmp_path / 'damaged.ippc').write_bytes(cache.IPPC_MAGIC + b'\x00garbage')
+    assert run(str(source), ippc=True).output == 'd'
+
+
+def test_front_end(tmp_path):
+    cachedir = tmp_path / 'cache'
+    source = os.path.join(TESTS, 'call_tail.xml')
+    run(source, ippc=True, cachedir=str(cachedir))
+    run(source, ippc=True, cachedir=str(cachedir), scan=True)
+    assert len(list(cachedir.glob('*.ippc'))) == 2
+    assert (cachedir / '.gitignore').read_text() == '*\n'
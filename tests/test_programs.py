@@ -0,0 +1,56 @@
+import glob
+import os
+
+import pytest
+
+from interpret import run
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+# every program has to give expected output and return code with each of these option sets
+OPTIONS = {
+    'reference': {},
+    'threaded': {'engine': 'threaded'},
+    'transpiled': {'engine': 'transpiled'},
+    'tracing': {'engine': 'tracing'},
+    'memo': {'memo': 10},
+    'scan': {'scan': True},
+    'ippc': {'ippc': True},
+    'scan-ippc': {'scan': True, 'ippc': True},
+}
+
+
+def programs():
+    """
+    Finds test programs with expected results, program.rc holds return code and program.out output,
+    program.in is input if there is one
+    :return: Sorted list of program paths
+    """
+    found = []
+    for rc in glob.glob(os.path.join(TESTS, '*.rc')):
+        base = rc[:-3]
+        found += [base + ext for ext in ('.xml', '.src') if os.path.exists(base + ext)]
+    return sorted(found)
+
+
+def expected(program, ext):
+    """
+    Reads file of expected result or input next to program
+    :param program: Path to program
+    :param ext: Extension of file
+    :return: Content as string, '' if file does not exist
+    """
+    path = os.path.splitext(program)[0] + ext
+    if not os.path.exists(path):
+        return ''
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('options', list(OPTIONS.values()), ids=list(OPTIONS))
+@pytest.mark.parametrize('program', programs(), ids=os.path.basename)
+def test_program(program, options, tmp_path):
+    # compiled program is stored on first run and loaded on second, both have to give the same result
+    for _ in range(2 if options.get('ippc') else 1):
+        result = run(program, expected(program, '.in'), cachedir=str(tmp_path), **options)
+        assert result.code == int(expected(program, '.rc'))
+        assert result.output == expected(program, '.out')
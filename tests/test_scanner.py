@@ -0,0 +1,38 @@
+import io
+import os
+
+import pytest
+
+from interpret import iterElements
+from scanner import scanProgram
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+def flatten(elements):
+    """
+    Turns root element and its children into comparable tuples
+    Children of root are not compared, parser may have some of them in root when it is yielded
+    :param elements: Root element followed by its child elements
+    :return: List of (tag, attributes, [(tag, attributes, text)])
+    """
+    elements = iter(elements)
+    root = next(elements)
+    return [(root.tag, dict(root.attrib), [])] + [(e.tag, dict(e.attrib), [(a.tag, dict(a.attrib), a.text) for a in e])
+                                                  for e in elements]
+
+
+@pytest.mark.parametrize('name, accepted', [
+    ('scan_references.xml', True),
+    ('scan_crlf.xml', True),
+    ('scan_cdata.xml', False),
+    ('scan_comment.xml', False),
+    ('scan_utf8.xml', False),
+])
+def test_scanner(name, accepted):
+    with open(os.path.join(TESTS, name), 'rb') as f:
+        data = f.read()
+    elements = scanProgram(data)
+    assert (elements is not None) == accepted
+    if accepted:
+        assert flatten(elements) == flatten(iterElements(io.BytesIO(data)))
@@ -0,0 +1,571 @@
+from instruction_handler import TYPENAMES, UNDECLARED
+
+
+class FrameView:
+    """
+    Class giving list-like access to slots of current LF or TF, which can change during interpreting
+    Missing frame reads as UNDECLARED, so fast paths fall back to reference handler
+    """
+    __slots__ = ('handler', 'frame')
+
+    def __init__(self, handler, frame):
+        self.handler = handler
+        self.frame = frame
+
+    def __getitem__(self, slot):
+        frame = getattr(self.handler, self.frame)
+        if frame is None:
+            return UNDECLARED
+        return frame.values[slot]
+
+    def __setitem__(self, slot, value):
+        getattr(self.handler, self.frame).values[slot] = value
+
+
+class ThreadedCode:
+    """
+    Execution engine turning every compiled instruction into specialized closure returning next program counter
+    Closures only handle the common case, anything else (including every error) goes to reference handler
+    of InstructionHandler, so semantics and exit codes stay the same
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.frames = {'GF': handler.GF.values,
+                       'LF': FrameView(handler, 'LF'),
+                       'TF': FrameView(handler, 'TF')}
+        self.code = []
+
+    def operand(self, arg):
+        """
+        Returns getter and key for reading operand, getter(key) gives native value,
+        None for uninitialized variable or UNDECLARED for missing variable
+        :param arg: Operand tuple
+        :return: Getter, key
+        """
+        argtype, frame, value = arg
+        if argtype == 'var':
+            return self.frames[frame].__getitem__, value
+        return (value,).__getitem__, 0
+
+    def destination(self, arg):
+        """
+        Returns frame slots and slot for writing into arg1 variable
+        :param arg: Operand tuple
+        :return: Frame slots, slot of variable
+        """
+        argtype, frame, slot = arg
+        if argtype != 'var':
+            return (UNDECLARED,), 0  # never declared, so the reference handler reports the error
+        return self.frames[frame], slot
+
+    def slow(self, op, nxt):
+        """
+        Creates closure calling reference handler of instruction
+        :param op: Compiled instruction
+        :param nxt: Index of following instruction
+        :return: Closure returning next program counter
+        """
+        ih = self.handler
+        handler = op.generic
+
+        def run():
+            ih.counter = nxt
+            handler(op)
+            return ih.counter
+        return run
+
+    def compile(self):
+        """
+        Builds closure for every instruction of compiled program
+        :return: Nothing
+        """
+        program = self.handler.program
+        self.code = [None] * len(program)
+        for i in range(1, len(program)):
+            op = program[i]
+            builder = getattr(self, op.name, None)
+            if builder is None:
+                self.code[i] = self.slow(op, i + 1)
+            else:
+                self.code[i] = builder(op, i + 1)
+
+    def run(self):
+        """
+        Main loop, every closure returns index of instruction to execute next
+        :return: Nothing
+        """
+        code = self.code
+        end = len(code)
+        pc = 1  # skip dummy start
+        executed = 0
+        try:
+            while pc < end:
+                pc = code[pc]()
+                executed += 1
+        finally:
+            self.handler.executed += executed
+
+    """ALL METHODS IMPLEMENTED BELLOW BUILD CLOSURE FOR ONE SPECIFIC INSTRUCTION"""
+    def MOVE(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get, key = self.operand(op.arg2)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val = get(key)
+            if val is not None and val is not UNDECLARED and dv[dn] is not UNDECLARED:
+                dv[dn] = val
+                return nxt
+            return slow()
+        return run
+
+    def ADD(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is int and type(val2) is int and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 + val2
+                return nxt
+            return slow()
+        return run
+
+    def SUB(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is int and type(val2) is int and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 - val2
+                return nxt
+            return slow()
+        return run
+
+    def MUL(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is int and type(val2) is int and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 * val2
+                return nxt
+            return slow()
+        return run
+
+    def IDIV(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is int and type(val2) is int and val2 != 0 and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 // val2
+                return nxt
+            return slow()
+        return run
+
+    def LT(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            type1 = type(val1)
+            if type1 is type(val2) and (type1 is int or type1 is str or type1 is bool) and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 < val2
+                return nxt
+            return slow()
+        return run
+
+    def GT(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            type1 = type(val1)
+            if type1 is type(val2) and (type1 is int or type1 is str or type1 is bool) and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 > val2
+                return nxt
+            return slow()
+        return run
+
+    def EQ(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            type1 = type(val1)
+            if type1 is type(val2) and val1 is not None and val1 is not UNDECLARED and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 == val2
+                return nxt
+            return slow()
+        return run
+
+    def AND(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is bool and type(val2) is bool and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 and val2
+                return nxt
+            return slow()
+        return run
+
+    def OR(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is bool and type(val2) is bool and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 or val2
+                return nxt
+            return slow()
+        return run
+
+    def NOT(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get, key = self.operand(op.arg2)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val = get(key)
+            if type(val) is bool and dv[dn] is not UNDECLARED:
+                dv[dn] = not val
+                return nxt
+            return slow()
+        return run
+
+    def CONCAT(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is str and type(val2) is str and dv[dn] is not UNDECLARED:
+                dv[dn] = val1 + val2
+                return nxt
+            return slow()
+        return run
+
+    def STRLEN(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get, key = self.operand(op.arg2)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val = get(key)
+            if type(val) is str and dv[dn] is not UNDECLARED:
+                dv[dn] = len(val)
+                return nxt
+            return slow()
+        return run
+
+    def GETCHAR(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is str and type(val2) is int and 0 <= val2 < len(val1) and dv[dn] is not UNDECLARED:
+                dv[dn] = val1[val2]
+                return nxt
+            return slow()
+        return run
+
+    def STRI2INT(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is str and type(val2) is int and 0 <= val2 < len(val1) and dv[dn] is not UNDECLARED:
+                dv[dn] = ord(val1[val2])
+                return nxt
+            return slow()
+        return run
+
+    def INT2CHAR(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        get, key = self.operand(op.arg2)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val = get(key)
+            if type(val) is int and 0 <= val < 0x110000 and dv[dn] is not UNDECLARED:
+                dv[dn] = chr(val)
+                return nxt
+            return slow()
+        return run
+
+    def TYPE(self, op, nxt):
+        dv, dn = self.destination(op.arg1)
+        slow = self.slow(op, nxt)
+        argtype, frame, slot = op.arg2
+        if argtype != 'var':
+            return slow
+        src = self.frames[frame]
+
+        def run():
+            val = src[slot]
+            if val is not UNDECLARED and dv[dn] is not UNDECLARED:
+                dv[dn] = TYPENAMES.get(type(val), '')
+                return nxt
+            return slow()
+        return run
+
+    def LABEL(self, op, nxt):
+        def run():
+            return nxt
+        return run
+
+    def JUMP(self, op, nxt):
+        target = op.target
+        if target is None:
+            return self.slow(op, nxt)
+
+        def run():
+            return target
+        return run
+
+    def JUMPIFEQ(self, op, nxt):
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        target = op.target
+        slow = self.slow(op, nxt)
+        if target is None:
+            return slow
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is type(val2) and val1 is not None and val1 is not UNDECLARED:
+                if val1 == val2:
+                    return target
+                return nxt
+            return slow()
+        return run
+
+    def JUMPIFNEQ(self, op, nxt):
+        get1, key1 = self.operand(op.arg2)
+        get2, key2 = self.operand(op.arg3)
+        target = op.target
+        slow = self.slow(op, nxt)
+        if target is None:
+            return slow
+
+        def run():
+            val1 = get1(key1)
+            val2 = get2(key2)
+            if type(val1) is type(val2) and val1 is not None and val1 is not UNDECLARED:
+                if val1 != val2:
+                    return target
+                return nxt
+            return slow()
+        return run
+
+    def CALL(self, op, nxt):
+        calls = self.handler.callStack.values
+        target = op.target
+        if target is None:
+            return self.slow(op, nxt)
+
+        def run():
+            calls.append(nxt)
+            return target
+        return run
+
+    def RETURN(self, op, nxt):
+        calls = self.handler.callStack.values
+        slow = self.slow(op, nxt)
+
+        def run():
+            if calls:
+                return calls.pop()
+            return slow()
+        return run
+
+    def PUSHS(self, op, nxt):
+        stack = self.handler.dataStack
+        get, key = self.operand(op.arg1)
+        slow = self.slow(op, nxt)
+
+        def run():
+            val = get(key)
+            if val is not None and val is not UNDECLARED:
+                stack.values.append(val)
+                return nxt
+            return slow()
+        return run
+
+    def POPS(self, op, nxt):
+        stack = self.handler.dataStack
+        dv, dn = self.destination(op.arg1)
+        slow = self.slow(op, nxt)
+
+        def run():
+            values = stack.values
+            if values and dv[dn] is not UNDECLARED:
+                dv[dn] = values.pop()
+                return nxt
+            return slow()
+        return run
+
+    def ADDS(self, op, nxt):
+        stack = self.handler.dataStack
+        slow = self.slow(op, nxt)
+
+        def run():
+            values = stack.values
+            if len(values) >= 2 and type(values[-1]) is int and type(values[-2]) is int:
+                val2 = values.pop()
+                values[-1] += val2
+                return nxt
+            return slow()
+        return run
+
+    def SUBS(self, op, nxt):
+        stack = self.handler.dataStack
+        slow = self.slow(op, nxt)
+
+        def run():
+            values = stack.values
+            if len(values) >= 2 and type(values[-1]) is int and type(values[-2]) is int:
+                val2 = values.pop()
+                values[-1] -= val2
+                return nxt
+            return slow()
+        return run
+
+    def MULS(self, op, nxt):
+        stack = self.handler.dataStack
+        slow = self.slow(op, nxt)
+
+        def run():
+            values = stack.values
+            if len(values) >= 2 and type(values[-1]) is int and type(values[-2]) is int:
+                val2 = values.pop()
+                values[-1] *= val2
+                return nxt
+            return slow()
+        return run
+
+    def LTS(self, op, nxt):
+        stack = self.handler.dataStack
+        slow = self.slow(op, nxt)
+
+        def run():
+            values = stack.values
+            if len(values) >= 2:
+                type1 = type(values[-2])
+                if type1 is type(values[-1]) and (type1 is int or type1 is str or type1 is bool):
+                    val2 = values.pop()
+                    values[-1] = values[-1] < val2
+                    return nxt
+            return slow()
+        return run
+
+    def GTS(self, op, nxt):
+        stack = self.handler.dataStack
+        slow = self.slow(op, nxt)
+
+        def run():
+            values = stack.values
+            if len(values) >= 2:
+                type1 = type(values[-2])
+                if type1 is type(values[-1]) and (type1 is int or type1 is str or type1 is bool):
+                    val2 = values.pop()
+                    values[-1] = values[-1] > val2
+                    return nxt
+            return slow()
+        return run
+
+    def EQS(self, op, nxt):
+        stack = self.handler.dataStack
+        slow = self.slow(op, nxt)
+
+        def run():
+            values = stack.values
+            if len(values) >= 2 and type(values[-2]) is type(values[-1]):
+                val2 = values.pop()
+                values[-1] = values[-1] == val2
+                return nxt
+            return slow()
+        return run
+
+    def JUMPIFEQS(self, op, nxt):
+        stack = self.handler.dataStack
+        target = op.target
+        slow = self.slow(op, nxt)
+        if target is None:
+            return slow
+
+        def run():
+            values = stack.values
+            if len(values) >= 2 and type(values[-2]) is type(values[-1]):
+                val2 = values.pop()
+                if values.pop() == val2:
+                    return target
+                return nxt
+            return slow()
+        return run
+
+    def JUMPIFNEQS(self, op, nxt):
+        stack = self.handler.dataStack
+        target = op.target
+        slow = self.slow(op, nxt)
+        if target is None:
+            return slow
+
+        def run():
+            values = stack.values
+            if len(values) >= 2 and type(values[-2]) is type(values[-1]):
+                val2 = values.pop()
+                if values.pop() != val2:
+                    return target
+                return nxt
+            return slow()
+        return run
@@ -0,0 +1,234 @@
+from transpiler import Transpiler
+
+# backward jumps to label before it is traced
+HOTLOOP = 50
+# longest recorded trace, longer ones are thrown away
+MAXTRACE = 500
+
+JUMPS = ['JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS']
+CONDITIONAL = {'JUMPIFEQ': 'a == b', 'JUMPIFNEQ': 'a != b',
+               'JUMPIFEQS': 'a == b', 'JUMPIFNEQS': 'a != b'}
+
+
+class TraceCompiler(Transpiler):
+    """
+    Class generating Python source for one recorded loop trace
+    Trace is straight line code repeated until some guard fails. Guards check operand types
+    (failed type guard calls reference handler and trace continues) and directions of branches
+    and returns (failed one leaves trace, so interpreter continues at right counter).
+    GF variables live in locals for whole loop and are written back only when trace is left.
+    """
+    def __init__(self, program, labels, gfSlots=None, localSlots=None):
+        super().__init__(program, labels, gfSlots, localSlots)
+        self.step = 0
+
+    def trace(self, header, path):
+        """
+        Generates module source with function running trace
+        :param header: Index of loop label trace starts at
+        :param path: Recorded (index, op, next counter) triples, op is None for call of inner trace
+        :return: Source code
+        """
+        self.locals = {}
+        self.assigned = []
+        for _, op, _ in path:
+            if op is None:
+                continue
+            for arg in (op.arg1, op.arg2, op.arg3):
+                if arg is not None and arg[0] == 'var' and arg[1] == 'GF' and arg[2] not in self.locals:
+                    self.locals[arg[2]] = f'g{len(self.locals)}'
+        # every local may be changed by previous iteration, so all of them are written back on exit
+        self.assigned = list(self.locals.values())
+
+        body = []
+        self.step = 0
+        for i, op, nxt in path:
+            if op is None:
+                body.append(f'# {i}: inner trace')
+                body += self.inner(i, nxt)
+                continue
+            body.append(f'# {i}: {op.name}')
+            self.step += 1
+            if op.name in CONDITIONAL:
+                body += self.branch(i, op, nxt)
+            elif op.name == 'JUMP':
+                pass
+            elif op.name == 'CALL':
+                body.append(f'calls.append({i + 1})')
+            elif op.name == 'RETURN':
+                body += self.returned(i, nxt)
+            else:
+                emit = getattr(self, op.name, None)
+                if emit is None:
+                    body += self.slowCall(i, op)
+                else:
+                    body += emit(i, op)
+        body.append(f'done += {self.step}')
+
+        lines = ['from instruction_handler import NIL, TYPENAMES, UNDECLARED',
+                 'from threaded_code import FrameView',
+                 '']
+        lines += self.prologue('vm, slow, traces')
+        lines.append(f'    def t{header}():')
+        lines += [f'        {local} = GF[{slot}]' for slot, local in self.locals.items()]
+        lines.append('        done = 0')
+        lines.append('        while True:')
+        lines += ['            ' + line for line in body]
+        lines.append(f'    return t{header}')
+        return '\n'.join(lines) + '\n'
+
+    def leave(self, target, step=None):
+        """
+        Returns statements leaving trace, result is next counter and number of executed instructions
+        """
+        if step is None:
+            step = self.step
+        return self.spill() + [f'return {target}, done + {step}']
+
+    def reload(self):
+        return [f'{local} = GF[{slot}]' for slot, local in self.locals.items()]
+
+    def branch(self, i, op, nxt):
+        """
+        Returns statements of conditional jump, trace continues only in recorded direction
+        """
+        taken = nxt == op.target
+        other = i + 1 if taken else op.target
+        if op.name.endswith('S'):
+            lines = ['values = stack.values',
+                     'if len(values) >= 2 and type(values[-2]) is type(values[-1]):',
+                     '    b = values.pop()',
+                     '    a = values.pop()']
+        else:
+            lines = [f'a = {self.read(op.arg2)}',
+                     f'b = {self.read(op.arg3)}',
+                     'if type(a) is type(b) and a is not None and a is not _U:']
+        if other == nxt:
+            # both directions continue at the same instruction
+            lines.append('    pass')
+        else:
+            condition = CONDITIONAL[op.name]
+            if taken:
+                condition = f'not ({condition})'
+            lines.append(f'    if {condition}:')
+            lines += ['        ' + line for line in self.leave(other)]
+        lines.append('else:')
+        lines += ['    ' + line for line in self.spill()]
+        lines.append(f'    return slow({i}), done + {self.step}')
+        return lines
+
+    def returned(self, i, nxt):
+        """
+        Returns statements of RETURN, trace continues only when it returns to recorded place
+        """
+        return ['if calls and calls[-1] == ' + str(nxt) + ':',
+                '    calls.pop()',
+                'else:'] + ['    ' + line for line in self.leave(i, self.step - 1)]
+
+    def inner(self, i, nxt):
+        """
+        Returns statements running already compiled trace of inner loop
+        """
+        lines = self.spill()
+        lines.append(f'target, n = traces[{i}]()')
+        lines.append('done += n')
+        lines += self.reload()
+        lines.append(f'if target != {nxt}:')
+        lines += ['    ' + line for line in self.leave('target')]
+        return lines
+
+
+class TracingJIT:
+    """
+    Interpreter loop counting backward jumps to labels, hot loops are recorded and compiled by TraceCompiler
+    Cold code runs on reference handlers, so no compile cost is paid for it
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.traces = [None] * len(handler.program)
+        self.hits = [0] * len(handler.program)
+
+    def slow(self, i):
+        """
+        Calls reference handler of instruction on given index
+        :param i: Index of instruction
+        :return: Next program counter
+        """
+        ih = self.handler
+        op = ih.program[i]
+        ih.counter = i + 1
+        op.handler(op)
+        return ih.counter
+
+    def run(self):
+        """
+        Main loop, runs compiled trace when there is one for current counter
+        :return: Nothing
+        """
+        ih = self.handler
+        program = ih.program
+        traces = self.traces
+        hits = self.hits
+        end = len(program)
+
+        ih.counter = 1  # skip dummy start
+        while ih.counter < end:
+            pc = ih.counter
+            trace = traces[pc]
+            if trace is not None:
+                ih.counter, n = trace()
+                ih.executed += n
+                continue
+            op = program[pc]
+            ih.counter = pc + 1
+            op.handler(op)
+            ih.executed += 1
+            target = ih.counter
+            if target <= pc and op.name in JUMPS and traces[target] is None:
+                hits[target] += 1
+                if hits[target] >= HOTLOOP:
+                    hits[target] = 0
+                    self.record(target)
+
+    def record(self, header):
+        """
+        Runs loop on reference handlers and records executed instructions until it gets back to header
+        :param header: Index of loop label
+        :return: Nothing
+        """
+        ih = self.handler
+        program = ih.program
+        end = len(program)
+        path = []
+        while ih.counter < end and len(path) < MAXTRACE:
+            pc = ih.counter
+            trace = self.traces[pc]
+            if trace is not None:
+                ih.counter, n = trace()
+                ih.executed += n
+                path.append((pc, None, ih.counter))
+            else:
+                op = program[pc]
+                # leaving program or jumping to unknown label ends recording
+                if op.name == 'EXIT' or (op.name in JUMPS + ['CALL'] and op.target is None):
+                    return
+                ih.counter = pc + 1
+                op.handler(op)
+                ih.executed += 1
+                path.append((pc, op, ih.counter))
+            if ih.counter == header:
+                self.traces[header] = self.compile(header, path)
+                return
+
+    def compile(self, header, path):
+        """
+        Compiles recorded trace
+        :param header: Index of loop label
+        :param path: Recorded trace
+        :return: Function running trace
+        """
+        ih = self.handler
+        source = TraceCompiler(ih.program, ih.labels, ih.gfSlots, ih.localSlots).trace(header, path)
+        namespace = {}
+        exec(compile(source, f'<trace {header}>', 'exec'), namespace)
+        return namespace['make'](ih, self.slow, self.traces)
@@ -0,0 +1,469 @@
+import importlib.util
+import os
+from instruction_handler import NIL
+from cache import writeAtomic
+
+# version of generated code, cached modules with different version are generated again
+VERSION = 2
+
+# instructions which end basic block, because they can change program counter
+BLOCKEND = ['JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS', 'CALL', 'RETURN', 'EXIT']
+
+
+def literal(value):
+    """
+    Returns Python source of native constant or operand tuple
+    :param value: Native value or operand tuple
+    :return: Source code
+    """
+    if value is NIL:
+        return 'NIL'
+    if isinstance(value, tuple):
+        return '(' + ''.join(literal(x) + ', ' for x in value) + ')'
+    return repr(value)
+
+
+class Transpiler:
+    """
+    Class splitting compiled program into basic blocks and generating Python source for them
+    Each block becomes function returning index of next block. GF variables used in block are kept
+    in Python locals and written back when block exits or calls reference handler.
+    Common well-typed cases are inlined, the rest (including every error) calls reference handler
+    of InstructionHandler, so semantics and exit codes stay the same.
+    """
+    def __init__(self, program, labels, gfSlots=None, localSlots=None):
+        self.program = program
+        self.labels = labels
+        self.gfSlots = gfSlots or {}
+        self.localSlots = localSlots or {}
+
+        # state of block being generated
+        self.locals = {}
+        self.assigned = []
+
+    def splitBlocks(self):
+        """
+        Splits program at labels and instructions changing program counter
+        :return: List of (start, end) index pairs, end is exclusive
+        """
+        leaders = {1}
+        for i in range(1, len(self.program)):
+            op = self.program[i]
+            if op.name == 'LABEL':
+                leaders.add(i)
+            elif op.name in BLOCKEND:
+                leaders.add(i + 1)
+        leaders = sorted(x for x in leaders if x < len(self.program))
+        return [(start, end) for start, end in zip(leaders, leaders[1:] + [len(self.program)])]
+
+    def source(self, digest=''):
+        """
+        Generates source of Python module with all blocks and data needed to rebuild compiled program
+        :param digest: Hash of XML source the module is generated from
+        :return: Source code
+        """
+        lines = ['# generated from IPPcode22 program by transpiler.py, do not edit',
+                 'from instruction_handler import NIL, TYPENAMES, UNDECLARED',
+                 'from threaded_code import FrameView',
+                 '',
+                 f'VERSION = {VERSION}',
+                 f'DIGEST = {digest!r}',
+                 f'LABELS = {self.labels!r}',
+                 f'GFSLOTS = {self.gfSlots!r}',
+                 f'LOCALSLOTS = {self.localSlots!r}',
+                 'PROGRAM = [']
+        for op in self.program[1:]:
+            lines.append(f'    ({op.name!r}, {literal(op.arg1)}, {literal(op.arg2)}, {literal(op.arg3)}, {op.target!r}),')
+        lines.append(']')
+
+        blocks = self.splitBlocks()
+        lines.append('SIZES = {' + ', '.join(f'{start}: {end - start}' for start, end in blocks) + '}')
+        lines += ['', ''] + self.prologue('vm, slow')
+        for start, end in blocks:
+            lines.append('')
+            lines += ['    ' + line for line in self.block(start, end)]
+        lines.append('')
+        lines.append('    return {' + ', '.join(f'{start}: b{start}' for start, _ in blocks) + '}')
+        return '\n'.join(lines) + '\n'
+
+    def prologue(self, params):
+        """
+        Returns start of function binding interpreter state used by generated code
+        :param params: Parameters of function, first one is InstructionHandler
+        :return: Lines of source
+        """
+        return [f'def make({params}):',
+                '    GF = vm.GF.values',
+                "    LF = FrameView(vm, 'LF')",
+                "    TF = FrameView(vm, 'TF')",
+                '    stack = vm.dataStack',
+                '    calls = vm.callStack.values',
+                '    _U = UNDECLARED',
+                '    ORDERED = (int, str, bool)']
+
+    def block(self, start, end):
+        """
+        Generates function for one basic block
+        :param start: Index of first instruction
+        :param end: Index after last instruction
+        :return: Lines of source
+        """
+        self.locals = {}
+        self.assigned = []
+        for i in range(start, end):
+            op = self.program[i]
+            for arg in (op.arg1, op.arg2, op.arg3):
+                if arg is not None and arg[0] == 'var' and arg[1] == 'GF' and arg[2] not in self.locals:
+                    self.locals[arg[2]] = f'g{len(self.locals)}'
+
+        body = []
+        terminated = False
+        for i in range(start, end):
+            op = self.program[i]
+            body.append(f'# {i}: {op.name}')
+            emit = getattr(self, op.name, None)
+            if emit is None:
+                body += self.slowCall(i, op)
+            else:
+                body += emit(i, op)
+            terminated = op.name in ['JUMP', 'CALL', 'RETURN', 'EXIT']
+        if not terminated:
+            body += self.exit(end)
+
+        lines = [f'def b{start}():']
+        lines += [f'    {local} = GF[{slot}]' for slot, local in self.locals.items()]
+        lines += ['    ' + line for line in body]
+        return lines
+
+    def read(self, arg):
+        """
+        Returns expression reading operand, missing or uninitialized variable gives _U or None
+        """
+        argtype, frame, value = arg
+        if argtype != 'var':
+            return literal(value)
+        if frame == 'GF':
+            return self.locals[value]
+        return f'{frame}[{value}]'
+
+    def declared(self, arg):
+        """
+        Returns condition checking that destination variable exists
+        """
+        argtype, frame, slot = arg
+        if argtype != 'var':
+            return 'False'
+        if frame == 'GF':
+            return f'{self.locals[slot]} is not _U'
+        return f'{frame}[{slot}] is not _U'
+
+    def assign(self, arg, expr):
+        """
+        Returns statement storing value of expression into destination variable
+        """
+        argtype, frame, slot = arg
+        if argtype != 'var':
+            # declared() is False for constant, so statement is never reached and reference handler reports error
+            return 'pass'
+        if frame == 'GF':
+            local = self.locals[slot]
+            if local not in self.assigned:
+                self.assigned.append(local)
+            return f'{local} = {expr}'
+        return f'{frame}[{slot}] = {expr}'
+
+    def spill(self):
+        """
+        Returns statements writing assigned locals back into GF
+        """
+        slots = {local: slot for slot, local in self.locals.items()}
+        return [f'if {local} is not _U: GF[{slots[local]}] = {local}' for local in self.assigned]
+
+    def slowCall(self, i, op, jump=False):
+        """
+        Returns statements calling reference handler of instruction
+        :param i: Index of instruction
+        :param op: Compiled instruction
+        :param jump: True if result of handler is next program counter of block
+        :return: Lines of source
+        """
+        lines = self.spill()
+        if jump:
+            return lines + [f'return slow({i})']
+        lines.append(f'slow({i})')
+        # reference handler can only write into arg1 variable
+        if op.arg1 is not None and op.arg1[0] == 'var' and op.arg1[1] == 'GF':
+            lines.append(f'{self.locals[op.arg1[2]]} = GF[{op.arg1[2]}]')
+        return lines
+
+    def exit(self, target):
+        return self.spill() + [f'return {target}']
+
+    def guarded(self, i, op, reads, guard, expr):
+        """
+        Returns statements evaluating expression into arg1 variable when guard holds,
+        otherwise calling reference handler
+        """
+        lines = [f'{var} = {self.read(arg)}' for var, arg in reads]
+        lines.append(f'if {guard} and {self.declared(op.arg1)}:')
+        lines.append('    ' + self.assign(op.arg1, expr))
+        lines.append('else:')
+        lines += ['    ' + line for line in self.slowCall(i, op)]
+        return lines
+
+    """ALL METHODS IMPLEMENTED BELLOW GENERATE SOURCE FOR ONE SPECIFIC INSTRUCTION"""
+    def MOVE(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2)], 'a is not None and a is not _U', 'a')
+
+    def ADD(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is int and type(b) is int', 'a + b')
+
+    def SUB(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is int and type(b) is int', 'a - b')
+
+    def MUL(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is int and type(b) is int', 'a * b')
+
+    def IDIV(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is int and type(b) is int and b != 0', 'a // b')
+
+    def LT(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is type(b) and type(a) in ORDERED', 'a < b')
+
+    def GT(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is type(b) and type(a) in ORDERED', 'a > b')
+
+    def EQ(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is type(b) and a is not None and a is not _U', 'a == b')
+
+    def AND(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is bool and type(b) is bool', 'a and b')
+
+    def OR(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is bool and type(b) is bool', 'a or b')
+
+    def NOT(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2)], 'type(a) is bool', 'not a')
+
+    def CONCAT(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is str and type(b) is str', 'a + b')
+
+    def STRLEN(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2)], 'type(a) is str', 'len(a)')
+
+    def GETCHAR(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is str and type(b) is int and 0 <= b < len(a)', 'a[b]')
+
+    def STRI2INT(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2), ('b', op.arg3)],
+                            'type(a) is str and type(b) is int and 0 <= b < len(a)', 'ord(a[b])')
+
+    def INT2CHAR(self, i, op):
+        return self.guarded(i, op, [('a', op.arg2)], 'type(a) is int and 0 <= a < 0x110000', 'chr(a)')
+
+    def TYPE(self, i, op):
+        if op.arg2[0] != 'var':
+            return self.slowCall(i, op)
+        return self.guarded(i, op, [('a', op.arg2)], 'a is not _U', "TYPENAMES.get(type(a), '')")
+
+    def DEFVAR(self, i, op):
+        _, frame, slot = op.arg1
+        if frame != 'GF':
+            return self.slowCall(i, op)
+        local = self.locals[slot]
+        return [f'if {local} is _U:',
+                '    ' + self.assign(op.arg1, 'None'),
+                'else:'] + ['    ' + line for line in self.slowCall(i, op)]
+
+    def LABEL(self, i, op):
+        return []
+
+    def JUMP(self, i, op):
+        if op.target is None:
+            return self.slowCall(i, op, jump=True)
+        return self.exit(op.target)
+
+    def conditional(self, i, op, reads, guard, condition):
+        if op.target is None:
+            return self.slowCall(i, op, jump=True)
+        lines = [f'{var} = {value}' for var, value in reads]
+        lines.append(f'if {guard}:')
+        lines.append(f'    if {condition}:')
+        lines += ['        ' + line for line in self.exit(op.target)]
+        lines.append('else:')
+        lines += ['    ' + line for line in self.slowCall(i, op, jump=True)]
+        return lines
+
+    def JUMPIFEQ(self, i, op):
+        return self.conditional(i, op, [('a', self.read(op.arg2)), ('b', self.read(op.arg3))],
+                                'type(a) is type(b) and a is not None and a is not _U', 'a == b')
+
+    def JUMPIFNEQ(self, i, op):
+        return self.conditional(i, op, [('a', self.read(op.arg2)), ('b', self.read(op.arg3))],
+                                'type(a) is type(b) and a is not None and a is not _U', 'a != b')
+
+    def JUMPIFEQS(self, i, op):
+        return self.conditional(i, op, [('values', 'stack.values')],
+                                'len(values) >= 2 and type(values[-2]) is type(values[-1])',
+                                'values.pop() == values.pop()')
+
+    def JUMPIFNEQS(self, i, op):
+        return self.conditional(i, op, [('values', 'stack.values')],
+                                'len(values) >= 2 and type(values[-2]) is type(values[-1])',
+                                'values.pop() != values.pop()')
+
+    def CALL(self, i, op):
+        if op.target is None:
+            return self.slowCall(i, op, jump=True)
+        return [f'calls.append({i + 1})'] + self.exit(op.target)
+
+    def RETURN(self, i, op):
+        return self.spill() + ['if calls:',
+                               '    return calls.pop()',
+                               f'return slow({i})']
+
+    def PUSHS(self, i, op):
+        return [f'a = {self.read(op.arg1)}',
+                'if a is not None and a is not _U:',
+                '    stack.values.append(a)',
+                'else:'] + ['    ' + line for line in self.slowCall(i, op)]
+
+    def POPS(self, i, op):
+        return ['values = stack.values',
+                f'if values and {self.declared(op.arg1)}:',
+                '    ' + self.assign(op.arg1, 'values.pop()'),
+                'else:'] + ['    ' + line for line in self.slowCall(i, op)]
+
+    def stackBinary(self, i, op, guard, expr):
+        return ['values = stack.values',
+                f'if len(values) >= 2 and {guard}:',
+                '    b = values.pop()',
+                '    a = values[-1]',
+                f'    values[-1] = {expr}',
+                'else:'] + ['    ' + line for line in self.slowCall(i, op)]
+
+    def ADDS(self, i, op):
+        return self.stackBinary(i, op, 'type(values[-1]) is int and type(values[-2]) is int', 'a + b')
+
+    def SUBS(self, i, op):
+        return self.stackBinary(i, op, 'type(values[-1]) is int and type(values[-2]) is int', 'a - b')
+
+    def MULS(self, i, op):
+        return self.stackBinary(i, op, 'type(values[-1]) is int and type(values[-2]) is int', 'a * b')
+
+    def LTS(self, i, op):
+        return self.stackBinary(i, op, 'type(values[-1]) is type(values[-2]) and type(values[-1]) in ORDERED',
+                                'a < b')
+
+    def GTS(self, i, op):
+        return self.stackBinary(i, op, 'type(values[-1]) is type(values[-2]) and type(values[-1]) in ORDERED',
+                                'a > b')
+
+    def EQS(self, i, op):
+        return self.stackBinary(i, op, 'type(values[-1]) is type(values[-2])', 'a == b')
+
+    def EXIT(self, i, op):
+        return self.slowCall(i, op, jump=True)
+
+
+def load(source, path=None):
+    """
+    Compiles generated source into module-like namespace
+    When path is given, source is written there and imported, so Python also caches its bytecode
+    :param source: Generated source code
+    :param path: Path of cached .py artifact or None
+    :return: Module object or dict namespace
+    """
+    if path is None:
+        namespace = {}
+        exec(compile(source, '<ippcode22>', 'exec'), namespace)
+        return namespace
+    writeAtomic(path, source.encode('utf-8'))
+    return loadCached(path)
+
+
+def loadCached(path):
+    """
+    Imports cached module generated by transpiler
+    :param path: Path of cached .py artifact
+    :return: Module object or None if artifact is missing or was generated by other version
+    """
+    if not os.path.isfile(path):
+        return None
+    name = 'ippc_' + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except (SyntaxError, ImportError):
+        return None
+    if getattr(module, 'VERSION', None) != VERSION:
+        return None
+    return module
+
+
+class TranspiledCode:
+    """
+    Block dispatcher running module generated by Transpiler on InstructionHandler state
+    """
+    def __init__(self, handler, module):
+        self.handler = handler
+        if isinstance(module, dict):
+            self.namespace = module
+        else:
+            self.namespace = vars(module)
+
+    def rebuildProgram(self):
+        """
+        Rebuilds compiled program and labels of handler from data stored in generated module,
+        so cached artifact can be run without parsing XML
+        :return: Nothing
+        """
+        namespace = self.namespace
+        self.handler.restore((namespace['LABELS'], namespace['GFSLOTS'], namespace['LOCALSLOTS'], namespace['PROGRAM']))
+
+    def slow(self, i):
+        """
+        Calls reference handler of instruction on given index
+        :param i: Index of instruction
+        :return: Next program counter
+        """
+        ih = self.handler
+        op = ih.program[i]
+        ih.counter = i + 1
+        op.handler(op)
+        return ih.counter
+
+    def run(self):
+        """
+        Main loop, every block returns index of block to execute next
+        :return: Nothing
+        """
+        ih = self.handler
+        end = len(ih.program)
+        blocks = [None] * end
+        sizes = [0] * end
+        for start, block in self.namespace['make'](ih, self.slow).items():
+            blocks[start] = block
+        for start, size in self.namespace['SIZES'].items():
+            sizes[start] = size
+
+        pc = 1  # skip dummy start
+        executed = 0
+        try:
+            while pc < end:
+                executed += sizes[pc]
+                pc = blocks[pc]()
+        finally:
+            ih.executed += executed